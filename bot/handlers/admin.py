@@ -294,3 +294,43 @@ async def audit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         report = "⚠️ *Audit Found Issues:*\n\n" + "\n\n".join(issues)
         await update.message.reply_text(report, parse_mode="Markdown")
+
+
+@admin_only
+async def recorder_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin command: /recorder — RecordBot capture and upload queue status."""
+    from bot.recordbot.recorder import (
+        active_recordings, active_captures, probe_engine, disk_budget, status_client, upload_cache,
+    )
+    from bot.recordbot.uploader import upload_scheduler
+    from bot.recordbot.client_pool import client_pool
+    from bot.recordbot.scheduler import model_scheduler
+
+    m = upload_scheduler.metrics()
+    p = client_pool.metrics()
+    d = disk_budget.metrics()
+    s = model_scheduler.metrics()
+    arms = status_client.stats_summary()
+    best = max(arms, key=lambda a: (not arms[a]["open"], arms[a]["success"]))
+    cooling = sum(1 for a in arms.values() if a["open"])
+    await update.message.reply_text(
+        f"📹 *RecordBot Status*\n\n"
+        f"🔴 Recordings: *{len(active_recordings)}* on *{len(active_captures)}* capture(s)\n"
+        f"🔎 Last sweep: *{probe_engine.last_sweep_size}* models in *{probe_engine.last_sweep_secs:.1f}s*, "
+        f"*{s['due']}/{s['tracked']}* due\n"
+        f"🌐 Status: best *{best}* ({arms[best]['success']:.0%}, {arms[best]['latency']:.1f}s), "
+        f"*{cooling}/{len(arms)}* cooling down\n\n"
+        f"⬆️ Upload queue: *{m['queued']}* ({m['queued_bytes'] / 1024 ** 2:.0f} MB), "
+        f"*{m['priority']}* priority\n"
+        f"⚙️ In flight: *{m['in_flight']}/{m['workers']}*, users waiting: *{m['users_waiting']}*\n"
+        f"⏳ Oldest wait: *{m['oldest_wait']:.0f}s*, max depth: *{m['max_depth']}*\n"
+        f"✅ Completed: *{m['completed']}*  ❌ Failed: *{m['failed']}*\n"
+        f"📡 Sessions: *{p['healthy']}/{p['sessions']}* healthy, *{p['flooded']}* flood-waiting, "
+        f"*{p['in_flight']}* in use\n"
+        f"♻️ Upload cache: *{upload_cache.hits}* hits, *{upload_cache.misses}* misses\n\n"
+        f"💾 Disk: *{d['state']}*, {d['free'] / 1024 ** 3:.1f} GB free "
+        f"(low {d['low_water_free'] / 1024 ** 3:.1f} GB)\n"
+        f"📦 Queued on disk: *{d['queued'] / 1024 ** 2:.0f} MB* for {d['users']} user(s) "
+        f"(peak {d['high_water_queued'] / 1024 ** 2:.0f} MB, per user {d['high_water_user'] / 1024 ** 2:.0f} MB)",
+        parse_mode="Markdown"
+    )
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+try:
+    from telethon import TelegramClient
+    from telethon.errors import FloodWaitError, ServerError
+    from telethon.sessions import StringSession
+    TELETHON_AVAILABLE = True
+    # Failures of the session's link to Telegram, as opposed to the file or request.
+    TRANSPORT_ERRORS = (ConnectionError, asyncio.TimeoutError, ServerError)
+except ImportError:
+    TELETHON_AVAILABLE = False
+    TRANSPORT_ERRORS = (ConnectionError, asyncio.TimeoutError)
+
+logger = logging.getLogger("RecordBot.ClientPool")
+
+TG_API_ID = int(os.environ.get("TG_API_ID", "0"))
+TG_API_HASH = os.environ.get("TG_API_HASH", "")
+TG_SESSIONS = [
+    s.strip() for s in os.environ.get("TG_SESSIONS", os.environ.get("TG_SESSION", "")).split(",")
+    if s.strip()
+]
+POOL_HEALTH_SECS = float(os.environ.get("TG_POOL_HEALTH_SECS", "30"))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get("TG_POOL_ACQUIRE_TIMEOUT", "600"))
+
+
+class PooledClient:
+    def __init__(self, index, session):
+        self.index = index
+        # Stable across restarts and reordering of TG_SESSIONS, unlike index.
+        self.key = hashlib.sha1(session.encode()).hexdigest()[:12]
+        self.client = TelegramClient(StringSession(session), TG_API_ID, TG_API_HASH)
+        # FloodWaits are surfaced instead of slept through so the upload can
+        # move to another session.
+        self.client.flood_sleep_threshold = 0
+        self.in_flight = 0
+        self.healthy = False
+        self.flood_until = 0.0
+        self.uploads = 0
+        self.failures = 0
+
+    def available(self, now):
+        return self.healthy and self.flood_until <= now
+
+
+class ClientPool:
+    """Telethon upload sessions handed out least-loaded first.
+
+    A session that hits a FloodWait is skipped until the wait expires; one
+    that fails otherwise is marked unhealthy and reconnected by the health
+    loop, never on the upload path.
+    """
+
+    def __init__(self, sessions=TG_SESSIONS):
+        self.entries = []
+        if TELETHON_AVAILABLE:
+            self.entries = [PooledClient(i, s) for i, s in enumerate(sessions)]
+        self.changed = asyncio.Event()
+        self.health_task = None
+
+    def start(self):
+        if self.health_task is None and self.entries:
+            self.health_task = asyncio.create_task(self._health_loop())
+
+    def size(self):
+        return len(self.entries)
+
+    def _pick(self, now, prefer):
+        candidates = [e for e in self.entries if e.available(now)]
+        if not candidates:
+            return None
+        for entry in candidates:
+            if entry.key == prefer:
+                return entry
+        return min(candidates, key=lambda e: (e.in_flight, e.uploads))
+
+    def try_acquire(self, key):
+        """Lease the session keyed `key` if it is available right now; None otherwise."""
+        self.start()
+        now = time.time()
+        for entry in self.entries:
+            if entry.key == key and entry.available(now):
+                entry.in_flight += 1
+                return entry
+        return None
+
+    async def acquire(self, prefer=None):
+        """Lease a session, favouring the one keyed `prefer` when it is available."""
+        if not self.entries:
+            raise RuntimeError("No Telegram upload sessions configured (TG_SESSIONS)")
+        self.start()
+        deadline = time.monotonic() + POOL_ACQUIRE_TIMEOUT
+        while True:
+            now = time.time()
+            entry = self._pick(now, prefer)
+            if entry:
+                entry.in_flight += 1
+                return entry
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("No Telegram upload session available")
+            flooded = [e.flood_until - now for e in self.entries if e.healthy]
+            wait = min([remaining, POOL_HEALTH_SECS] + [w for w in flooded if w > 0])
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, entry, error=None):
+        """Return a session to the pool; True if `error` is worth retrying on another one."""
+        entry.in_flight -= 1
+        retry = False
+        if error is None:
+            entry.uploads += 1
+        elif TELETHON_AVAILABLE and isinstance(error, FloodWaitError):
+            entry.flood_until = time.time() + error.seconds
+            logger.warning(f"Session #{entry.index} flood-waited for {error.seconds}s")
+            retry = True
+        elif isinstance(error, TRANSPORT_ERRORS):
+            entry.failures += 1
+            entry.healthy = False
+            logger.warning(f"Session #{entry.index} marked unhealthy: {error}")
+            retry = True
+        else:
+            entry.failures += 1
+        self.changed.set()
+        return retry
+
+    async def _check(self, entry):
+        try:
+            if entry.client.is_connected():
+                # Never drop a live connection under uploads still running on it.
+                if entry.healthy or entry.in_flight:
+                    return
+                await entry.client.disconnect()
+            await entry.client.connect()
+            if not await entry.client.is_user_authorized():
+                logger.error(f"Session #{entry.index} is not authorized — leaving it out of the pool")
+                return
+            if not entry.healthy:
+                logger.info(f"Session #{entry.index} connected")
+            entry.healthy = True
+            self.changed.set()
+        except Exception as e:
+            entry.healthy = False
+            logger.warning(f"Session #{entry.index} reconnect failed: {e}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check(e) for e in self.entries))
+            await asyncio.sleep(POOL_HEALTH_SECS)
+
+    def metrics(self):
+        now = time.time()
+        return {
+            "sessions": len(self.entries),
+            "healthy": sum(1 for e in self.entries if e.healthy),
+            "flooded": sum(1 for e in self.entries if e.healthy and e.flood_until > now),
+            "in_flight": sum(e.in_flight for e in self.entries),
+        }
+
+
+client_pool = ClientPool()
@@ -49,10 +49,52 @@ def init_recordbot_db():
             started_at TEXT,
             ended_at TEXT,
             duration_seconds REAL DEFAULT 0,
-            status TEXT DEFAULT 'recording'
+            status TEXT DEFAULT 'recording',
+            billed_seconds REAL DEFAULT 0,
+            capture_dir TEXT,
+            part_offset INTEGER DEFAULT 0,
+            paused_seconds REAL DEFAULT 0
         )
     """)
 
+    for column in (
+        "billed_seconds REAL DEFAULT 0", "capture_dir TEXT", "part_offset INTEGER DEFAULT 0",
+        "paused_seconds REAL DEFAULT 0",
+    ):
+        try:
+            c.execute(f"ALTER TABLE recordbot_recordings ADD COLUMN {column}")
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS recordbot_ledger_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            flushed_seq INTEGER DEFAULT 0
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS recordbot_upload_cache (
+            sha256 TEXT PRIMARY KEY,
+            file_ref TEXT,
+            created_at TEXT
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS recordbot_model_transitions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_name TEXT,
+            online INTEGER,
+            at TEXT
+        )
+    """)
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recordbot_model_transitions_at "
+        "ON recordbot_model_transitions(at)"
+    )
+
     c.execute("""
         CREATE TABLE IF NOT EXISTS recordbot_activation_codes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -155,6 +197,46 @@ def deduct_credits(telegram_id, seconds):
     conn.close()
 
 
+def apply_credit_deductions(user_seconds, recording_seconds, seq):
+    conn = get_conn()
+    conn.executemany(
+        "UPDATE recordbot_users SET credit_seconds = MAX(0, credit_seconds - ?) WHERE telegram_id = ?",
+        [(seconds, telegram_id) for telegram_id, seconds in user_seconds.items()]
+    )
+    conn.executemany(
+        "UPDATE recordbot_recordings SET billed_seconds = billed_seconds + ? WHERE id = ?",
+        [(seconds, rec_id) for rec_id, seconds in recording_seconds.items()]
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO recordbot_ledger_state (id, flushed_seq) VALUES (1, ?)",
+        (seq,)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_ledger_flushed_seq():
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT flushed_seq FROM recordbot_ledger_state WHERE id = 1"
+    ).fetchone()
+    conn.close()
+    return row["flushed_seq"] if row else 0
+
+
+def get_credit_balances(telegram_ids):
+    if not telegram_ids:
+        return {}
+    conn = get_conn()
+    placeholders = ",".join("?" for _ in telegram_ids)
+    rows = conn.execute(
+        f"SELECT telegram_id, credit_seconds FROM recordbot_users WHERE telegram_id IN ({placeholders})",
+        list(telegram_ids)
+    ).fetchall()
+    conn.close()
+    return {row["telegram_id"]: row["credit_seconds"] for row in rows}
+
+
 def get_remaining_credits(telegram_id):
     user = get_rb_user(telegram_id)
     if not user:
@@ -162,6 +244,40 @@ def get_remaining_credits(telegram_id):
     return user["credit_seconds"]
 
 
+def get_upload_ref(sha256):
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT file_ref FROM recordbot_upload_cache WHERE sha256 = ?", (sha256,)
+    ).fetchone()
+    conn.close()
+    return row["file_ref"] if row else None
+
+
+def store_upload_ref(sha256, file_ref):
+    conn = get_conn()
+    now = datetime.utcnow().isoformat()
+    conn.execute(
+        "INSERT OR REPLACE INTO recordbot_upload_cache (sha256, file_ref, created_at) VALUES (?, ?, ?)",
+        (sha256, file_ref, now)
+    )
+    conn.commit()
+    conn.close()
+
+
+def delete_upload_ref(sha256):
+    conn = get_conn()
+    conn.execute("DELETE FROM recordbot_upload_cache WHERE sha256 = ?", (sha256,))
+    conn.commit()
+    conn.close()
+
+
+def prune_upload_refs(before):
+    conn = get_conn()
+    conn.execute("DELETE FROM recordbot_upload_cache WHERE created_at < ?", (before,))
+    conn.commit()
+    conn.close()
+
+
 def update_rb_credentials(telegram_id, username, password_hash):
     conn = get_conn()
     conn.execute(
@@ -220,29 +336,39 @@ def get_all_monitored_models():
     return rows
 
 
-def start_recording_entry(telegram_id, model_name):
+def start_recording_entry(telegram_id, model_name, capture_dir=None, part_offset=0):
     conn = get_conn()
     now = datetime.utcnow().isoformat()
     c = conn.cursor()
     c.execute("""
         INSERT INTO recordbot_recordings
-        (user_telegram_id, model_name, started_at, status)
-        VALUES (?, ?, ?, 'recording')
-    """, (telegram_id, model_name, now))
+        (user_telegram_id, model_name, started_at, status, capture_dir, part_offset)
+        VALUES (?, ?, ?, 'recording', ?, ?)
+    """, (telegram_id, model_name, now, capture_dir, part_offset))
     rec_id = c.lastrowid
     conn.commit()
     conn.close()
     return rec_id
 
 
-def end_recording_entry(rec_id, duration_seconds):
+def end_recording_entry(rec_id, duration_seconds, status="completed"):
     conn = get_conn()
     now = datetime.utcnow().isoformat()
     conn.execute("""
         UPDATE recordbot_recordings
-        SET ended_at = ?, duration_seconds = ?, status = 'completed'
+        SET ended_at = ?, duration_seconds = ?, status = ?
         WHERE id = ?
-    """, (now, duration_seconds, rec_id))
+    """, (now, duration_seconds, status, rec_id))
+    conn.commit()
+    conn.close()
+
+
+def add_paused_seconds(rec_seconds):
+    conn = get_conn()
+    conn.executemany(
+        "UPDATE recordbot_recordings SET paused_seconds = paused_seconds + ? WHERE id = ?",
+        [(seconds, rec_id) for rec_id, seconds in rec_seconds]
+    )
     conn.commit()
     conn.close()
 
@@ -266,6 +392,45 @@ def get_all_active_recordings():
     return rows
 
 
+def record_model_transition(model_name, online):
+    conn = get_conn()
+    now = datetime.utcnow().isoformat()
+    conn.execute(
+        "INSERT INTO recordbot_model_transitions (model_name, online, at) VALUES (?, ?, ?)",
+        (model_name, 1 if online else 0, now)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_model_transitions(since):
+    conn = get_conn()
+    rows = conn.execute(
+        "SELECT model_name, online, at FROM recordbot_model_transitions WHERE at >= ? ORDER BY at, id",
+        (since,)
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def prune_model_transitions(before):
+    conn = get_conn()
+    conn.execute("DELETE FROM recordbot_model_transitions WHERE at < ?", (before,))
+    conn.commit()
+    conn.close()
+
+
+def get_last_live_times():
+    conn = get_conn()
+    rows = conn.execute("""
+        SELECT model_name, MAX(COALESCE(ended_at, started_at)) AS last_live
+        FROM recordbot_recordings
+        GROUP BY model_name
+    """).fetchall()
+    conn.close()
+    return rows
+
+
 def store_rb_activation_code(code, email, plan_key, credit_hours):
     conn = get_conn()
     now = datetime.utcnow().isoformat()
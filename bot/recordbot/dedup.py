@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from bot.recordbot.database import (
+    get_upload_ref, store_upload_ref, delete_upload_ref, prune_upload_refs,
+)
+
+logger = logging.getLogger("RecordBot.Dedup")
+
+UPLOAD_DEDUP = os.environ.get("UPLOAD_DEDUP", "1") == "1"
+UPLOAD_CACHE_DAYS = int(os.environ.get("UPLOAD_CACHE_DAYS", "7"))
+UPLOAD_CACHE_PRUNE_SECS = 3600
+HASH_CHUNK = 1024 * 1024
+MAX_DIGESTS = 4096
+
+
+def _sha256(filepath):
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class UploadCache:
+    """Telegram file references of segments already uploaded, keyed by content sha256.
+
+    Hard links handed to several subscribers share an inode, so each segment
+    is hashed once. claim() serialises deliveries of the same content before
+    they reach the upload workers: the first one uploads, the rest wait
+    outside the worker pool and then send by reference.
+    """
+
+    def __init__(self):
+        self.digests = {}
+        self.locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.last_prune = 0.0
+
+    async def digest(self, filepath):
+        st = os.stat(filepath)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        future = self.digests.get(key)
+        if future is None:
+            if len(self.digests) >= MAX_DIGESTS:
+                self.digests.clear()
+            future = asyncio.get_event_loop().run_in_executor(None, _sha256, filepath)
+            self.digests[key] = future
+        try:
+            return await future
+        except Exception:
+            self.digests.pop(key, None)
+            raise
+
+    @asynccontextmanager
+    async def claim(self, digest):
+        entry = self.locks.setdefault(digest, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.locks[digest]
+
+    def get(self, digest):
+        ref = get_upload_ref(digest)
+        if ref is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(ref)
+
+    def put(self, digest, ref):
+        store_upload_ref(digest, json.dumps(ref))
+        now = time.monotonic()
+        if now - self.last_prune >= UPLOAD_CACHE_PRUNE_SECS:
+            self.last_prune = now
+            prune_upload_refs((datetime.utcnow() - timedelta(days=UPLOAD_CACHE_DAYS)).isoformat())
+
+    def forget(self, digest):
+        delete_upload_ref(digest)
+
+
+upload_cache = UploadCache()
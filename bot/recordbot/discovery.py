@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("RecordBot.Discovery")
+
+DISCOVERY = os.environ.get("DISCOVERY", "0") == "1"
+DISCOVERY_URL = os.environ.get(
+    "DISCOVERY_URL", "https://chaturbate.com/api/public/affiliates/onlinerooms/"
+)
+DISCOVERY_WM = os.environ.get("DISCOVERY_WM", "")
+DISCOVERY_INTERVAL = float(os.environ.get("DISCOVERY_INTERVAL", "60"))
+DISCOVERY_PAGE_SIZE = int(os.environ.get("DISCOVERY_PAGE_SIZE", "500"))
+DISCOVERY_MAX_PAGES = int(os.environ.get("DISCOVERY_MAX_PAGES", "100"))
+DISCOVERY_MAX_AGE = 3 * DISCOVERY_INTERVAL
+
+
+class RoomDirectory:
+    """Set of live usernames built from the paginated online-rooms listing.
+
+    Only a complete listing is trusted; a failed or truncated fetch keeps the
+    previous set until it is DISCOVERY_MAX_AGE old.
+    """
+
+    def __init__(self, fetch_json):
+        self.fetch_json = fetch_json
+        self.live = set()
+        self.updated = 0.0
+        self.pages = 0
+        self.lock = asyncio.Lock()
+
+    def usable(self):
+        return bool(self.updated) and time.monotonic() - self.updated < DISCOVERY_MAX_AGE
+
+    async def refresh(self):
+        """Re-fetches the listing when it is older than DISCOVERY_INTERVAL; True if usable."""
+        async with self.lock:
+            if self.updated and time.monotonic() - self.updated < DISCOVERY_INTERVAL:
+                return True
+            started = time.monotonic()
+            live = set()
+            offset = pages = 0
+            while pages < DISCOVERY_MAX_PAGES:
+                data = await self.fetch_json(DISCOVERY_URL, params={
+                    "wm": DISCOVERY_WM,
+                    "client_ip": "request_ip",
+                    "format": "json",
+                    "limit": DISCOVERY_PAGE_SIZE,
+                    "offset": offset,
+                })
+                rooms = data.get("results") if isinstance(data, dict) else None
+                count = data.get("count") if isinstance(data, dict) else None
+                # Without a usable count there is no telling whether the listing is complete.
+                if not isinstance(rooms, list) or not isinstance(count, int):
+                    logger.warning(f"Room listing failed at page {pages + 1}")
+                    return self.usable()
+                pages += 1
+                offset += len(rooms)
+                for room in rooms:
+                    if not isinstance(room, dict):
+                        continue
+                    if room.get("username") and room.get("current_show", "public") == "public":
+                        live.add(room["username"].lower())
+                if not rooms or offset >= count:
+                    break
+            else:
+                logger.warning(f"Room listing exceeds {DISCOVERY_MAX_PAGES} pages — not trusting it")
+                return self.usable()
+
+            self.live = live
+            self.pages = pages
+            self.updated = time.monotonic()
+            logger.info(
+                f"Room listing: {len(live)} live rooms across {pages} page(s) "
+                f"in {self.updated - started:.1f}s"
+            )
+            return True
+
+    def is_live(self, model):
+        return model.lower() in self.live
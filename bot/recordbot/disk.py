@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import shutil
+
+logger = logging.getLogger("RecordBot.Disk")
+
+DISK_MIN_FREE_BYTES = int(os.environ.get("DISK_MIN_FREE_MB", "2048")) * 1024 * 1024
+DISK_QUEUE_BUDGET_BYTES = int(os.environ.get("DISK_QUEUE_BUDGET_MB", "0")) * 1024 * 1024
+DISK_USER_BUDGET_BYTES = int(os.environ.get("DISK_USER_BUDGET_MB", "0")) * 1024 * 1024
+DISK_CHECK_SECS = 10
+
+OK, HIGH, CRITICAL = "ok", "high", "critical"
+
+
+class DiskBudget:
+    """Tracks bytes waiting for upload against free space and configured budgets.
+
+    Hard links of one segment count once towards the total, and once per user
+    towards that user's share. HIGH starts at twice the free-space floor or 75% of the queue budget;
+    CRITICAL at the floor or the full budget. Budgets of 0 are unlimited.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.inodes = {}
+        self.per_user = {}
+        self.total = 0
+        self.state = OK
+        self.free = None
+        self.high_water_total = 0
+        self.high_water_user = {}
+        self.low_water_free = None
+
+    def add(self, uid, filepath):
+        if filepath in self.files:
+            return
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return
+        size = st.st_size
+        inode = (st.st_dev, st.st_ino)
+        self.files[filepath] = (uid, size, inode)
+        self.per_user[uid] = self.per_user.get(uid, 0) + size
+        entry = self.inodes.get(inode)
+        if entry:
+            entry[1] += 1
+        else:
+            self.inodes[inode] = [size, 1]
+            self.total += size
+        self.high_water_total = max(self.high_water_total, self.total)
+        self.high_water_user[uid] = max(self.high_water_user.get(uid, 0), self.per_user[uid])
+
+    def remove(self, filepath):
+        entry = self.files.pop(filepath, None)
+        if entry is None:
+            return
+        uid, size, inode = entry
+        links = self.inodes[inode]
+        links[1] -= 1
+        if links[1] == 0:
+            del self.inodes[inode]
+            self.total -= links[0]
+        self.per_user[uid] -= size
+        if self.per_user[uid] <= 0:
+            del self.per_user[uid]
+
+    def check(self):
+        try:
+            self.free = shutil.disk_usage(self.path).free
+        except OSError as e:
+            logger.warning(f"Cannot stat {self.path}: {e}")
+            return self.state
+        if self.low_water_free is None or self.free < self.low_water_free:
+            self.low_water_free = self.free
+
+        budget = DISK_QUEUE_BUDGET_BYTES
+        if self.free < DISK_MIN_FREE_BYTES or (budget and self.total >= budget):
+            state = CRITICAL
+        elif self.free < 2 * DISK_MIN_FREE_BYTES or (budget and self.total >= budget * 0.75):
+            state = HIGH
+        else:
+            state = OK
+        if state != self.state:
+            log = logger.warning if state != OK else logger.info
+            log(
+                f"Disk pressure {self.state} → {state}: {self.free / 1024 ** 3:.1f} GB free, "
+                f"{self.total / 1024 ** 2:.0f} MB queued for upload"
+            )
+            self.state = state
+        return state
+
+    def admit(self, uid):
+        if self.state == CRITICAL:
+            return False
+        return not DISK_USER_BUDGET_BYTES or self.per_user.get(uid, 0) < DISK_USER_BUDGET_BYTES
+
+    def segment_scale(self):
+        return {OK: 1, HIGH: 0.5, CRITICAL: 0.25}[self.state]
+
+    def metrics(self):
+        return {
+            "state": self.state,
+            "free": self.free or 0,
+            "queued": self.total,
+            "users": len(self.per_user),
+            "high_water_queued": self.high_water_total,
+            "high_water_user": max(self.high_water_user.values(), default=0),
+            "low_water_free": self.low_water_free or 0,
+        }
+
+
+async def disk_monitor(budget, on_change):
+    """Re-evaluates disk pressure periodically and calls `on_change(state)` on transitions."""
+    last = None
+    while True:
+        try:
+            state = budget.check()
+            if state != last:
+                on_change(state)
+                last = state
+        except Exception as e:
+            logger.exception(f"Disk monitor error: {e}")
+        await asyncio.sleep(DISK_CHECK_SECS)
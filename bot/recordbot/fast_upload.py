@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+try:
+    from telethon.network import MTProtoSender
+    from telethon.tl.functions.upload import SaveBigFilePartRequest
+    from telethon.tl.types import InputFileBig
+    TELETHON_AVAILABLE = True
+except ImportError:
+    TELETHON_AVAILABLE = False
+
+logger = logging.getLogger("RecordBot.FastUpload")
+
+UPLOAD_CONNECTIONS = int(os.environ.get("UPLOAD_CONNECTIONS", "4"))
+UPLOAD_PART_SIZE = 512 * 1024
+# Below Telegram's big-file threshold the regular single-stream upload is used.
+PARALLEL_MIN_BYTES = 10 * 1024 * 1024
+CHECKPOINT_SUFFIX = ".upload.json"
+CHECKPOINT_EVERY = 8
+# Telegram drops the parts of an unfinished upload after about a day.
+CHECKPOINT_MAX_AGE = 20 * 3600
+
+
+def use_parallel_upload(size):
+    return TELETHON_AVAILABLE and size >= PARALLEL_MIN_BYTES
+
+
+class UploadCheckpoint:
+    """Sidecar file listing the parts of an upload Telegram has acknowledged.
+
+    Parts live on Telegram's side under (session, file_id), so a resumed
+    upload must reuse both; reset() starts over when the session changes.
+    """
+
+    def __init__(self, filepath):
+        self.path = filepath + CHECKPOINT_SUFFIX
+        self.size = os.path.getsize(filepath)
+        self.part_size = UPLOAD_PART_SIZE
+        self.file_id = random.randrange(-2 ** 63, 2 ** 63)
+        self.session = None
+        self.acked = set()
+        self.created = time.time()
+        self.unsaved = 0
+
+    @classmethod
+    def load(cls, filepath):
+        checkpoint = cls(filepath)
+        try:
+            with open(checkpoint.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return checkpoint
+        if (
+            data.get("size") != checkpoint.size
+            or data.get("part_size") != checkpoint.part_size
+            or time.time() - data.get("created", 0) > CHECKPOINT_MAX_AGE
+        ):
+            return checkpoint
+        checkpoint.file_id = data["file_id"]
+        checkpoint.session = data.get("session")
+        checkpoint.acked = set(data["acked"])
+        checkpoint.created = data["created"]
+        return checkpoint
+
+    def reset(self, session):
+        if self.acked:
+            logger.info(f"Restarting upload of {os.path.basename(self.path)}: {len(self.acked)} part(s) discarded")
+        self.file_id = random.randrange(-2 ** 63, 2 ** 63)
+        self.session = session
+        self.acked = set()
+        self.created = time.time()
+
+    def resumed_bytes(self):
+        return min(self.size, len(self.acked) * self.part_size)
+
+    def ack(self, part):
+        self.acked.add(part)
+        self.unsaved += 1
+        if self.unsaved >= CHECKPOINT_EVERY:
+            self.save()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "file_id": self.file_id, "size": self.size, "part_size": self.part_size,
+                "session": self.session, "acked": sorted(self.acked), "created": self.created,
+            }, f)
+        os.replace(tmp, self.path)
+        self.unsaved = 0
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+async def _create_sender(client):
+    # Extra connections to the account's home DC reuse its auth key, so no
+    # authorization export/import round trip is needed.
+    dc = await client._get_dc(client.session.dc_id)
+    sender = MTProtoSender(client.session.auth_key, loggers=client._log)
+    await sender.connect(client._connection(
+        dc.ip_address, dc.port, dc.id, loggers=client._log, proxy=client._proxy,
+    ))
+    return sender
+
+
+async def _disconnect(senders):
+    for sender in senders:
+        try:
+            await sender.disconnect()
+        except Exception:
+            pass
+
+
+async def parallel_upload(client, filepath, connections=UPLOAD_CONNECTIONS,
+                          progress_callback=None, checkpoint=None):
+    """Upload `filepath` over several MTProto connections and return its InputFileBig.
+
+    Parts already acknowledged in `checkpoint` are skipped, and every new
+    acknowledgement is recorded there.
+    """
+    checkpoint = checkpoint or UploadCheckpoint(filepath)
+    size = checkpoint.size
+    total_parts = (size + UPLOAD_PART_SIZE - 1) // UPLOAD_PART_SIZE
+    pending = [p for p in range(total_parts - 1, -1, -1) if p not in checkpoint.acked]
+    sent_bytes = [checkpoint.resumed_bytes()]
+    if checkpoint.acked:
+        logger.info(
+            f"Resuming {os.path.basename(filepath)}: {len(checkpoint.acked)}/{total_parts} parts already sent"
+        )
+
+    connections = max(1, min(connections, len(pending)))
+    senders = []
+    if connections > 1:
+        results = await asyncio.gather(
+            *(_create_sender(client) for _ in range(connections)), return_exceptions=True
+        )
+        senders = [r for r in results if not isinstance(r, BaseException)]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await _disconnect(senders)
+            raise errors[0]
+        calls = [sender.send for sender in senders]
+    else:
+        calls = [client]
+
+    async def worker(call):
+        with open(filepath, "rb") as f:
+            while pending:
+                part = pending.pop()
+                f.seek(part * UPLOAD_PART_SIZE)
+                chunk = f.read(UPLOAD_PART_SIZE)
+                await call(SaveBigFilePartRequest(checkpoint.file_id, part, total_parts, chunk))
+                checkpoint.ack(part)
+                sent_bytes[0] += len(chunk)
+                if progress_callback:
+                    result = progress_callback(sent_bytes[0], size)
+                    if asyncio.iscoroutine(result):
+                        await result
+
+    tasks = [asyncio.create_task(worker(call)) for call in calls]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await _disconnect(senders)
+        checkpoint.save()
+
+    logger.info(
+        f"Uploaded {os.path.basename(filepath)} in {total_parts} parts "
+        f"over {connections} connection(s)"
+    )
+    return InputFileBig(checkpoint.file_id, total_parts, os.path.basename(filepath))
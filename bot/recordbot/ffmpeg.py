@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import deque
+
+logger = logging.getLogger("RecordBot.FFmpeg")
+
+# stderr lines that mean the HLS source hiccupped rather than went away.
+TRANSIENT_ERRORS = (
+    "connection reset", "connection refused", "timed out", "timeout",
+    "server returned 5", "http error 5", "input/output error", "i/o error",
+    "broken pipe", "end of file", "invalid data found",
+)
+# The stream is gone (offline, private, or the token expired): restarting won't help.
+FATAL_ERRORS = (
+    "server returned 401", "server returned 403", "server returned 404",
+    "http error 401", "http error 403", "http error 404",
+)
+
+
+class FFmpegProcess:
+    """An ffmpeg child on asyncio: awaitable exit, stderr forwarded to the log."""
+
+    def __init__(self, proc, label):
+        self.proc = proc
+        self.label = label
+        self.pid = proc.pid
+        self.started = time.monotonic()
+        self.returncode = None
+        self.ended_at = None
+        self.stderr_tail = deque(maxlen=20)
+        self.exited = asyncio.Event()
+        self.on_exit = None
+        self._stderr_task = asyncio.create_task(self._pump_stderr())
+        self._wait_task = asyncio.create_task(self._wait())
+
+    @classmethod
+    async def start(cls, cmd, label):
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            env=os.environ.copy(),
+        )
+        return cls(proc, label)
+
+    async def _pump_stderr(self):
+        while True:
+            line = await self.proc.stderr.readline()
+            if not line:
+                return
+            text = line.decode(errors="replace").strip()
+            if text:
+                self.stderr_tail.append(text)
+                logger.warning(f"[{self.label}] ffmpeg[{self.pid}]: {text}")
+
+    async def _wait(self):
+        self.returncode = await self.proc.wait()
+        self.ended_at = time.time()
+        await self._stderr_task
+        logger.info(
+            f"[{self.label}] ffmpeg[{self.pid}] exited with {self.returncode} "
+            f"after {self.uptime():.0f}s"
+        )
+        self.exited.set()
+        if self.on_exit:
+            self.on_exit()
+
+    def running(self):
+        return not self.exited.is_set()
+
+    def uptime(self):
+        return time.monotonic() - self.started
+
+    def transient_failure(self):
+        if self.running() or self.returncode == 0:
+            return False
+        tail = " ".join(self.stderr_tail).lower()
+        if any(p in tail for p in FATAL_ERRORS):
+            return False
+        return any(p in tail for p in TRANSIENT_ERRORS)
+
+    async def wait(self):
+        await self.exited.wait()
+        return self.returncode
+
+    async def stop(self, timeout=15):
+        """SIGINT so ffmpeg writes its trailer; SIGKILL if it is still up after `timeout`."""
+        if self.running():
+            try:
+                self.proc.send_signal(signal.SIGINT)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(self.exited.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"[{self.label}] ffmpeg[{self.pid}] ignored SIGINT for {timeout}s — killing")
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:
+                    pass
+        return await self.wait()
@@ -0,0 +1,71 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+
+logger = logging.getLogger("RecordBot.FSWatch")
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_EVENT = struct.Struct("iIII")
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _libc.inotify_init1
+    _libc.inotify_add_watch
+    INOTIFY_AVAILABLE = True
+except (OSError, AttributeError):
+    INOTIFY_AVAILABLE = False
+
+
+class DirWatch:
+    """Calls `callback(names)` from the event loop whenever files in `path` change."""
+
+    def __init__(self, path, callback, mask=IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO):
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if _libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+        self.callback = callback
+        self.loop = asyncio.get_event_loop()
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        names = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            start = offset + _EVENT.size
+            names.append(os.fsdecode(data[start:start + length].rstrip(b"\0")))
+            offset = start + length
+        try:
+            self.callback(names)
+        except Exception as e:
+            logger.exception(f"Watch callback failed: {e}")
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.loop.remove_reader(self.fd)
+        os.close(self.fd)
+        self.fd = None
+
+
+def watch_dir(path, callback):
+    if not INOTIFY_AVAILABLE:
+        return None
+    try:
+        return DirWatch(path, callback)
+    except OSError as e:
+        logger.warning(f"inotify unavailable for {path}, falling back to polling: {e}")
+        return None
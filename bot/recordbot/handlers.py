@@ -12,13 +12,14 @@ from bot.recordbot.config import RECORDBOT_PLANS, RECORDBOT_CHANNEL_ID, get_pric
 from bot.recordbot.database import (
     get_rb_user, get_rb_user_by_username, get_rb_user_by_code,
     create_rb_user, update_rb_credentials, add_model, remove_model,
-    get_user_models, get_remaining_credits, get_rb_activation_code,
+    get_user_models, get_rb_activation_code,
     mark_rb_code_used, add_credits, get_conn,
 )
 from bot.recordbot.recorder import (
     get_user_active_recordings, stop_user_recording, recording_key,
     active_recordings,
 )
+from bot.recordbot.ledger import credit_ledger
 
 stripe.api_key = STRIPE_SECRET_KEY
 
@@ -258,6 +259,7 @@ async def rb_activation_check(update: Update, context: ContextTypes.DEFAULT_TYPE
     email = record["email"]
 
     create_rb_user(telegram_id, email, code, "", credit_hours)
+    credit_ledger.invalidate(telegram_id)
     mark_rb_code_used(code, telegram_id)
 
     user = get_rb_user(telegram_id)
@@ -588,7 +590,7 @@ async def rb_total_credits(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     telegram_id = context.user_data.get("rb_telegram_id", update.effective_user.id)
-    credits_seconds = get_remaining_credits(telegram_id)
+    credits_seconds = credit_ledger.remaining(telegram_id)
 
     hours = int(credits_seconds // 3600)
     minutes = int((credits_seconds % 3600) // 60)
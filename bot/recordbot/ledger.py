@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import os
+
+from bot.recordbot.database import (
+    DB_PATH, apply_credit_deductions, get_ledger_flushed_seq, get_credit_balances,
+)
+
+logger = logging.getLogger("RecordBot.Ledger")
+
+LEDGER_JOURNAL = os.environ.get(
+    "LEDGER_JOURNAL", os.path.join(os.path.dirname(DB_PATH), "credit_ledger.journal")
+)
+LEDGER_FLUSH_SECS = float(os.environ.get("LEDGER_FLUSH_SECS", "60"))
+
+
+class CreditLedger:
+    """In-memory credit balances with an append-only journal of unflushed charges.
+
+    Every charge is journaled (and fsynced) before it is applied in memory.
+    flush() writes the aggregated charges and the last journal sequence number
+    in one transaction, so on restart only entries past that number are replayed.
+    """
+
+    def __init__(self, journal_path=LEDGER_JOURNAL):
+        self.journal_path = journal_path
+        self.balances = {}
+        self.pending = {}
+        self.pending_recordings = {}
+        self.seq = 0
+        self._journal = None
+        self.loaded = False
+
+    def load(self):
+        if self.loaded:
+            return
+        flushed_seq = get_ledger_flushed_seq()
+        self.seq = flushed_seq
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write was never applied.
+                        continue
+                    if entry["seq"] <= flushed_seq:
+                        continue
+                    self._apply(entry["uid"], entry["secs"], entry.get("rec"))
+                    self.seq = max(self.seq, entry["seq"])
+                    replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} unflushed credit charge(s) from journal")
+        self.flush()
+        self.loaded = True
+
+    def _open_journal(self):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._journal = open(self.journal_path, "a")
+        return self._journal
+
+    def _apply(self, uid, seconds, rec_id):
+        self.pending[uid] = self.pending.get(uid, 0) + seconds
+        if rec_id is not None:
+            self.pending_recordings[rec_id] = self.pending_recordings.get(rec_id, 0) + seconds
+
+    def charge_many(self, charges):
+        charges = [(uid, seconds, rec_id) for uid, seconds, rec_id in charges if seconds > 0]
+        if not charges:
+            return
+        journal = self._open_journal()
+        for uid, seconds, rec_id in charges:
+            self.seq += 1
+            journal.write(json.dumps({"seq": self.seq, "uid": uid, "secs": seconds, "rec": rec_id}) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        for uid, seconds, rec_id in charges:
+            self._apply(uid, seconds, rec_id)
+
+    def charge(self, uid, seconds, rec_id=None):
+        self.charge_many([(uid, seconds, rec_id)])
+
+    def remaining(self, uid):
+        if uid not in self.balances:
+            self.balances[uid] = get_credit_balances([uid]).get(uid, 0)
+        return max(0, self.balances[uid] - self.pending.get(uid, 0))
+
+    def invalidate(self, uid):
+        """Drops the cached balance so the next remaining() re-reads the database."""
+        self.balances.pop(uid, None)
+
+    def flush(self):
+        if self.pending or self.pending_recordings:
+            apply_credit_deductions(self.pending, self.pending_recordings, self.seq)
+            logger.info(
+                f"Flushed {sum(self.pending.values()):.0f}s of charges for "
+                f"{len(self.pending)} user(s)"
+            )
+            self.pending = {}
+            self.pending_recordings = {}
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            open(self.journal_path, "w").close()
+
+        # Refresh every balance we serve so purchases made elsewhere show up.
+        if self.balances:
+            self.balances = get_credit_balances(list(self.balances))
+
+
+credit_ledger = CreditLedger()
+
+
+async def ledger_flusher():
+    while True:
+        await asyncio.sleep(LEDGER_FLUSH_SECS)
+        try:
+            credit_ledger.flush()
+        except Exception as e:
+            logger.exception(f"Credit ledger flush failed: {e}")
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("RecordBot.PostProcess")
+
+POSTPROCESS = os.environ.get("POSTPROCESS", "0") == "1"
+POSTPROCESS_WORKERS = int(os.environ.get("POSTPROCESS_WORKERS", "1"))
+POSTPROCESS_TIMEOUT = 600
+FFMPEG_CMD = os.environ.get("FFMPEG_CMD", "ffmpeg")
+FFPROBE_CMD = os.environ.get("FFPROBE_CMD", "ffprobe")
+THUMB_WIDTH = 320
+
+_executor = None
+
+
+def _probe(filepath):
+    out = subprocess.run(
+        [
+            FFPROBE_CMD, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height:format=duration", "-of", "json", filepath,
+        ],
+        capture_output=True, text=True, timeout=60, check=True,
+    ).stdout
+    data = json.loads(out)
+    stream = (data.get("streams") or [{}])[0]
+    return {
+        "duration": float(data.get("format", {}).get("duration") or 0),
+        "width": int(stream.get("width") or 0),
+        "height": int(stream.get("height") or 0),
+    }
+
+
+def _process(filepath):
+    """Runs in a worker process: faststart remux in place, then probe and thumbnail."""
+    base = filepath[:-len(".mp4")] if filepath.endswith(".mp4") else filepath
+    tmp = base + ".faststart.mp4"
+    try:
+        subprocess.run(
+            [
+                FFMPEG_CMD, "-hide_banner", "-loglevel", "error", "-y",
+                "-i", filepath, "-c", "copy", "-map", "0", "-movflags", "+faststart", tmp,
+            ],
+            timeout=POSTPROCESS_TIMEOUT, check=True,
+        )
+        os.replace(tmp, filepath)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    meta = _probe(filepath)
+    thumb = base + ".jpg"
+    try:
+        subprocess.run(
+            [
+                FFMPEG_CMD, "-hide_banner", "-loglevel", "error", "-y",
+                "-ss", str(min(1.0, meta["duration"] / 2)), "-i", filepath,
+                "-frames:v", "1", "-vf", f"scale={THUMB_WIDTH}:-2", "-q:v", "4", thumb,
+            ],
+            timeout=60, check=True,
+        )
+        meta["thumb"] = thumb
+    except (subprocess.SubprocessError, OSError):
+        pass
+    return meta
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=POSTPROCESS_WORKERS)
+    return _executor
+
+
+async def postprocess_segment(filepath):
+    """Remux `filepath` for instant playback; returns its video metadata, or None."""
+    if not POSTPROCESS:
+        return None
+    try:
+        meta = await asyncio.get_event_loop().run_in_executor(_get_executor(), _process, filepath)
+    except Exception as e:
+        logger.warning(f"Post-processing {os.path.basename(filepath)} failed, uploading as-is: {e}")
+        return None
+    logger.info(
+        f"Post-processed {os.path.basename(filepath)}: {meta['duration']:.0f}s "
+        f"{meta['width']}x{meta['height']}"
+    )
+    return meta
@@ -0,0 +1,92 @@
+import logging
+import os
+import time
+from collections import Counter
+
+logger = logging.getLogger("RecordBot.Predictor")
+
+PREDICT_WEEKS = int(os.environ.get("PREDICT_WEEKS", "8"))
+PREDICT_THRESHOLD = float(os.environ.get("PREDICT_THRESHOLD", "0.25"))
+PREDICT_BIN_SECS = 900
+WEEK_SECS = 7 * 86400
+WEEK_BINS = WEEK_SECS // PREDICT_BIN_SECS
+
+
+class SchedulePredictor:
+    """Time-of-week histogram of go-live times per model.
+
+    Go-lives are binned into 15-minute slots of the week; a slot is a likely
+    start window when a go-live fell in it or a neighbouring slot in at least
+    PREDICT_THRESHOLD of the observed weeks. Needs one week of history.
+    """
+
+    def __init__(self):
+        self.state = {}
+        self.starts = {}
+        self.first_seen = {}
+        self._histograms = {}
+
+    def load(self, transitions):
+        """Replays persisted (model, online, unix time) transitions, oldest first."""
+        for model, online, ts in transitions:
+            self._apply(model, online, ts)
+        logger.info(
+            f"Loaded {sum(len(s) for s in self.starts.values())} go-live(s) "
+            f"for {len(self.state)} model(s)"
+        )
+
+    def _apply(self, model, online, ts):
+        prev = self.state.get(model)
+        self.state[model] = online
+        self.first_seen.setdefault(model, ts)
+        if online and prev is False:
+            starts = self.starts.setdefault(model, [])
+            starts.append(ts)
+            cutoff = ts - PREDICT_WEEKS * WEEK_SECS
+            while starts and starts[0] < cutoff:
+                starts.pop(0)
+            self._histograms.pop(model, None)
+        return prev != online
+
+    def observe(self, model, online, now=None):
+        """Records a status observation; True if it is a transition worth persisting."""
+        return self._apply(model, online, now or time.time())
+
+    def has_history(self, model, now=None):
+        first = self.first_seen.get(model)
+        return bool(self.starts.get(model)) and first is not None and (now or time.time()) - first >= WEEK_SECS
+
+    def _histogram(self, model):
+        hist = self._histograms.get(model)
+        if hist is None:
+            hist = self._histograms[model] = Counter(
+                int(ts % WEEK_SECS) // PREDICT_BIN_SECS for ts in self.starts.get(model, ())
+            )
+        return hist
+
+    def probability(self, model, ts):
+        """Share of observed weeks with a go-live within one slot of `ts`'s time of week."""
+        hist = self._histogram(model)
+        slot = int(ts % WEEK_SECS) // PREDICT_BIN_SECS
+        hits = sum(hist[(slot + d) % WEEK_BINS] for d in (-1, 0, 1))
+        weeks = max(1.0, min(PREDICT_WEEKS, (ts - self.first_seen[model]) / WEEK_SECS))
+        return min(1.0, hits / weeks)
+
+    def in_window(self, model, now=None):
+        now = now or time.time()
+        return self.has_history(model, now) and self.probability(model, now) >= PREDICT_THRESHOLD
+
+    def until_window(self, model, now=None, horizon=WEEK_SECS):
+        """Seconds until the next likely start window within `horizon`, or None."""
+        now = now or time.time()
+        if not self.has_history(model, now):
+            return None
+        offset = 0.0
+        while offset <= horizon:
+            if self.probability(model, now + offset) >= PREDICT_THRESHOLD:
+                return offset
+            offset += PREDICT_BIN_SECS - (now + offset) % PREDICT_BIN_SECS
+        return None
+
+
+schedule_predictor = SchedulePredictor()
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("RecordBot.Prober")
+
+PROBE_CONCURRENCY = int(os.environ.get("PROBE_CONCURRENCY", "16"))
+PROBE_RPS = float(os.environ.get("PROBE_RPS", "4"))
+PROBE_CACHE_TTL = float(os.environ.get("PROBE_CACHE_TTL", "30"))
+
+
+class RateLimiter:
+    """Token bucket shared by every outgoing status request."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProbeEngine:
+    def __init__(self, check, concurrency=PROBE_CONCURRENCY, cache_ttl=PROBE_CACHE_TTL):
+        self.check = check
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._inflight = {}
+        self.last_sweep_secs = 0.0
+        self.last_sweep_size = 0
+
+    async def _probe(self, model):
+        async with self.semaphore:
+            try:
+                return await self.check(model)
+            except Exception as e:
+                logger.warning(f"[{model}] Status check failed: {e}")
+                return None
+
+    def cached(self, model):
+        entry = self._cache.get(model)
+        if entry and time.monotonic() - entry[0] < self.cache_ttl:
+            return entry[1]
+        return None
+
+    async def probe(self, model):
+        result = self.cached(model)
+        if result is not None:
+            return result
+        task = self._inflight.get(model)
+        if task is None:
+            task = asyncio.ensure_future(self._probe(model))
+            self._inflight[model] = task
+            task.add_done_callback(lambda t: self._store(model, t))
+        return await asyncio.shield(task)
+
+    def _store(self, model, task):
+        self._inflight.pop(model, None)
+        if not task.cancelled() and task.result() is not None:
+            self._cache[model] = (time.monotonic(), task.result())
+
+    def invalidate(self, model):
+        self._cache.pop(model, None)
+
+    def prune(self):
+        now = time.monotonic()
+        for model in [m for m, (ts, _) in self._cache.items() if now - ts >= self.cache_ttl]:
+            del self._cache[model]
+
+    async def sweep(self, models):
+        distinct = list(dict.fromkeys(models))
+        started = time.monotonic()
+        results = await asyncio.gather(*(self.probe(m) for m in distinct))
+        self.last_sweep_secs = time.monotonic() - started
+        self.last_sweep_size = len(distinct)
+        self.prune()
+        statuses = dict(zip(distinct, results))
+        online = sum(1 for r in results if r)
+        logger.info(
+            f"Probe sweep: {len(models)} subscriptions, {len(distinct)} models, "
+            f"{online} online, {self.last_sweep_secs:.1f}s"
+        )
+        return statuses
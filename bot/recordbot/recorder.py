@@ -1,10 +1,12 @@
 import asyncio
+import contextlib
+import functools
 import logging
 import os
-import signal
-import subprocess
+import shutil
 import sys
 import time
+from datetime import datetime, timezone
 
 try:
     import requests
@@ -12,30 +14,39 @@ except ImportError:
     requests = None
 
 try:
-    from curl_cffi import requests as cf_requests
-    CURL_CFFI_AVAILABLE = True
-except ImportError:
-    CURL_CFFI_AVAILABLE = False
-
-try:
-    from telethon import TelegramClient
-    from telethon.sessions import StringSession
-    from telethon.tl.types import InputPeerUser
+    from telethon.tl.types import DocumentAttributeVideo, InputDocument, InputPeerUser
     TELETHON_AVAILABLE = True
 except ImportError:
     TELETHON_AVAILABLE = False
 
 from bot.recordbot.database import (
-    get_all_monitored_models, get_remaining_credits,
-    deduct_credits, start_recording_entry, end_recording_entry,
-    get_all_active_recordings
+    get_all_monitored_models, start_recording_entry, end_recording_entry,
+    get_all_active_recordings, get_last_live_times, record_model_transition, add_paused_seconds,
+    get_model_transitions, prune_model_transitions
+)
+from bot.recordbot.prober import ProbeEngine, RateLimiter, PROBE_RPS
+from bot.recordbot.status_client import StatusClient
+from bot.recordbot.resolver import resolve_hls_url
+from bot.recordbot.fswatch import watch_dir
+from bot.recordbot.ledger import credit_ledger, ledger_flusher
+from bot.recordbot.streaming import StreamingUpload
+from bot.recordbot.uploader import (
+    upload_scheduler, transport_router, UPLOAD_WORKERS, UPLOAD_PRESSURE_WORKERS,
+)
+from bot.recordbot.fast_upload import (
+    CHECKPOINT_SUFFIX, UploadCheckpoint, parallel_upload, use_parallel_upload,
 )
+from bot.recordbot.client_pool import client_pool
+from bot.recordbot.dedup import UPLOAD_DEDUP, upload_cache
+from bot.recordbot.postprocess import POSTPROCESS, postprocess_segment
+from bot.recordbot.disk import DiskBudget, disk_monitor, OK
+from bot.recordbot.ffmpeg import FFmpegProcess
+from bot.recordbot.scheduler import model_scheduler
+from bot.recordbot.predictor import schedule_predictor, PREDICT_WEEKS, WEEK_SECS
+from bot.recordbot.discovery import DISCOVERY, RoomDirectory
 
 logger = logging.getLogger("RecordBot.Recorder")
 
-TG_API_ID = int(os.environ.get("TG_API_ID", "0"))
-TG_API_HASH = os.environ.get("TG_API_HASH", "")
-TG_SESSION = os.environ.get("TG_SESSION", "")
 _tg_dest_raw = os.environ.get("RECORDBOT_TG_DEST", os.environ.get("TG_DEST", "me"))
 try:
     TG_DEST = int(_tg_dest_raw)
@@ -44,28 +55,69 @@ except ValueError:
 
 SEGMENT_MAX_BYTES = int(os.environ.get("SEGMENT_MAX_BYTES", str(500 * 1024 * 1024)))
 SIZE_CHECK_SECS = 5
+LIVENESS_CHECK_SECS = 30
+SEGMENT_MODE = os.environ.get("SEGMENT_MODE", "muxer")
+SEGMENT_SECONDS = int(os.environ.get("SEGMENT_SECONDS", "600"))
+STREAMING_UPLOAD = (
+    os.environ.get("STREAMING_UPLOAD", "0") == "1"
+    and SEGMENT_MODE == "muxer" and TELETHON_AVAILABLE
+)
 VIDEOS_DIR = os.environ.get("VIDEOS_DIR", "/tmp/recordings")
-YOUTUBE_DL_CMD = os.environ.get("YOUTUBE_DL_CMD", "yt-dlp")
 FFMPEG_CMD = os.environ.get("FFMPEG_CMD", "ffmpeg")
 RATE_LIMIT_TIME = 5
 POLL_INTERVAL = 60
 CREDIT_CHECK_INTERVAL = 30
+SHARED_CAPTURE = os.environ.get("SHARED_CAPTURE", "1") == "1"
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", "3"))
+UPLOAD_RETRY_BACKOFF = 60
+ORPHAN_SWEEP_SECS = int(os.environ.get("ORPHAN_SWEEP_SECS", "900"))
+CAPTURES_DIR = os.path.join(VIDEOS_DIR, "_captures")
+FFMPEG_MAX_RESTARTS = int(os.environ.get("FFMPEG_MAX_RESTARTS", "5"))
+# A process that ran this long was healthy; its failure starts a fresh restart budget.
+FFMPEG_STABLE_SECS = 120
+RECONNECT_GRACE_SECS = int(os.environ.get("RECONNECT_GRACE_SECS", "180"))
+RECONNECT_MAX_DELAY = 60
 
 os.makedirs(VIDEOS_DIR, exist_ok=True)
 
-_IMPERSONATE_TARGETS = ["chrome131", "chrome124", "chrome120", "chrome116", "chrome110"]
 
+class Capture:
+    """One ffmpeg ingest of a live model, fanned out to every subscribed recording."""
 
-class UserRecording:
-    def __init__(self, user_telegram_id, model_name, out_dir, ffmpeg_proc, current_file, db_rec_id):
-        self.user_telegram_id = user_telegram_id
+    def __init__(self, key, model_name, out_dir, ffmpeg_proc, current_file, hls_url):
+        self.key = key
         self.model_name = model_name
         self.out_dir = out_dir
         self.ffmpeg_proc = ffmpeg_proc
         self.current_file = current_file
+        self.hls_url = hls_url
+        self.restarts = 0
+        self.billing_paused = False
+        self.paused_at = None
+        self.segment_list = _segment_list_path(out_dir)
+        self.segment_scale = disk_budget.segment_scale()
+        self.list_offset = 0
+        self.subscribers = {}
+        self.segment_count = 0
+        self.fanout_tasks = []
+        self.watcher_task = None
+        self.wakeup = asyncio.Event()
+        self.fs_watch = None
+        self.streams = {}
+        self.closing = False
+
+
+class UserRecording:
+    def __init__(self, user_telegram_id, model_name, out_dir, capture, db_rec_id):
+        self.user_telegram_id = user_telegram_id
+        self.model_name = model_name
+        self.out_dir = out_dir
+        self.capture = capture
         self.db_rec_id = db_rec_id
         self.start_time = time.time()
         self.stopping = False
+        self.wakeup = asyncio.Event()
+        self.released = asyncio.Event()
         self.segment_count = 0
         self.upload_tasks = []
         self.watcher_task = None
@@ -81,27 +133,12 @@ class UserRecording:
 
 
 active_recordings = {}
+active_captures = {}
+_capture_locks = {}
 _ptb_bot = None
-_upload_client = None
-_upload_client_lock = asyncio.Lock()
-
-
-def _telethon_client():
-    if not TELETHON_AVAILABLE:
-        return None
-    return TelegramClient(StringSession(TG_SESSION), TG_API_ID, TG_API_HASH)
-
-
-async def _get_upload_client():
-    if not TELETHON_AVAILABLE:
-        return None
-    global _upload_client
-    async with _upload_client_lock:
-        if _upload_client is None or not _upload_client.is_connected():
-            _upload_client = _telethon_client()
-            if _upload_client:
-                await _upload_client.connect()
-        return _upload_client
+_queued_uploads = set()
+_recovered = []
+disk_budget = DiskBudget(VIDEOS_DIR)
 
 
 async def _resolve_dest(client):
@@ -133,202 +170,395 @@ async def tg_notify(text, chat_id=None):
             logger.warning(f"PTB notify failed: {e}")
 
 
-async def tg_upload(filepath, caption, dest_chat_id=None):
-    size_mb = os.path.getsize(filepath) / 1024 ** 2
-    logger.info(f"Uploading: {os.path.basename(filepath)} ({size_mb:.0f} MB)")
+async def tg_upload(filepath, caption, dest_chat_id=None, meta=None, digest=None):
+    ref = await _upload_file(filepath, caption, dest_chat_id, meta)
+    if ref and digest:
+        upload_cache.put(digest, ref)
+    return ref is not None
+
+
+async def _send_cached(digest, filepath, caption, dest_chat_id):
+    ref = upload_cache.get(digest)
+    if not ref:
+        return False
+    sent = await _send_by_reference(ref, caption, dest_chat_id)
+    if sent:
+        logger.info(f"Sent {os.path.basename(filepath)} by reference ({ref['transport']})")
+        return True
+    # None means the reference is not usable from here, False that it went stale.
+    if sent is False:
+        upload_cache.forget(digest)
+    return False
+
 
-    if dest_chat_id and _ptb_bot:
+async def _send_by_reference(ref, caption, dest_chat_id):
+    if ref["transport"] == "bot_api":
+        if not (ref.get("file_id") and dest_chat_id and _ptb_bot):
+            return None
         try:
-            with open(filepath, "rb") as f:
-                await _ptb_bot.send_video(
-                    chat_id=dest_chat_id,
-                    video=f,
-                    caption=caption,
-                    parse_mode="Markdown",
-                    read_timeout=300,
-                    write_timeout=300,
-                    connect_timeout=60,
-                )
-            logger.info(f"Upload complete via PTB to {dest_chat_id}: {os.path.basename(filepath)}")
+            await _ptb_bot.send_video(
+                chat_id=dest_chat_id, video=ref["file_id"],
+                caption=caption, parse_mode="Markdown",
+            )
             return True
         except Exception as e:
-            logger.warning(f"PTB upload failed, trying Telethon: {e}")
-
-    last_logged = [0]
-
-    def progress(sent, total):
-        pct = sent / total * 100
-        if pct - last_logged[0] >= 10 or pct >= 100:
-            last_logged[0] = pct
-            logger.info(f"  ↑ {os.path.basename(filepath)}: {pct:.0f}%")
+            logger.warning(f"PTB send by file_id failed: {e}")
+            return False
 
+    if not ref.get("id") or client_pool.size() == 0:
+        return None
+    # Never wait for the session here: the caller holds the digest's claim.
+    lease = client_pool.try_acquire(ref["session"])
+    if lease is None:
+        return None
     try:
-        client = await _get_upload_client()
-        if dest_chat_id:
-            dest = await client.get_input_entity(dest_chat_id)
-        else:
-            dest = await _resolve_dest(client)
-        await client.send_file(
-            dest, filepath, caption=caption,
-            supports_streaming=True, progress_callback=progress,
-        )
-        logger.info(f"Upload complete: {os.path.basename(filepath)}")
-        return True
+        client = lease.client
+        dest = await client.get_input_entity(dest_chat_id) if dest_chat_id else await _resolve_dest(client)
+        media = InputDocument(ref["id"], ref["access_hash"], bytes.fromhex(ref["file_reference"]))
+        await client.send_file(dest, media, caption=caption, supports_streaming=True)
     except Exception as e:
-        logger.exception(f"Upload failed for {filepath}: {e}")
-        global _upload_client
-        _upload_client = None
+        client_pool.release(lease, e)
+        logger.warning(f"Send by document reference failed: {e}")
         return False
+    client_pool.release(lease)
+    return True
 
 
-def _is_online(username):
-    if not CURL_CFFI_AVAILABLE:
-        logger.error("curl_cffi not available")
+async def _upload_file(filepath, caption, dest_chat_id, meta):
+    """Upload over the routed transports; returns a reusable file reference or None."""
+    size = os.path.getsize(filepath)
+    transports = transport_router.choose(
+        size, bot_api=bool(dest_chat_id and _ptb_bot), mtproto=client_pool.size() > 0,
+    )
+    logger.info(
+        f"Uploading: {os.path.basename(filepath)} ({size / 1024 ** 2:.0f} MB) "
+        f"via {' → '.join(transports) or 'nothing'}"
+    )
+    for transport in transports:
+        if transport == "bot_api":
+            ref = await _bot_api_upload(filepath, caption, dest_chat_id, meta)
+        else:
+            ref = await _mtproto_upload(filepath, caption, dest_chat_id, meta)
+        transport_router.record(transport, size, ref is not None)
+        if ref is not None:
+            return ref
+    return None
+
+
+def _video_kwargs(meta):
+    if not meta:
+        return {}
+    kwargs = {}
+    if meta.get("duration"):
+        kwargs["duration"] = int(meta["duration"])
+    if meta.get("width") and meta.get("height"):
+        kwargs["width"] = meta["width"]
+        kwargs["height"] = meta["height"]
+    return kwargs
+
+
+def _video_attributes(meta):
+    kwargs = _video_kwargs(meta)
+    if "duration" not in kwargs or "width" not in kwargs:
         return None
+    return [DocumentAttributeVideo(
+        kwargs["duration"], kwargs["width"], kwargs["height"], supports_streaming=True,
+    )]
 
-    common_headers = {
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Cache-Control": "no-cache",
-        "Upgrade-Insecure-Requests": "1",
-    }
 
-    for target in _IMPERSONATE_TARGETS:
-        try:
-            time.sleep(3)
-            session = cf_requests.Session(impersonate=target)
-            page_resp = session.get(
-                f"https://chaturbate.com/{username}/",
-                headers=common_headers, timeout=25,
-            )
-            if page_resp.status_code == 403:
-                continue
+def _thumb(meta):
+    thumb = meta.get("thumb") if meta else None
+    return thumb if thumb and os.path.exists(thumb) else None
+
 
-            csrf_token = session.cookies.get("csrftoken", "")
-            r = session.post(
-                "https://chaturbate.com/get_edge_hls_url_ajax/",
-                headers={
-                    "X-Requested-With": "XMLHttpRequest",
-                    "X-CSRFToken": csrf_token,
-                    "Referer": f"https://chaturbate.com/{username}/",
-                    "Accept": "application/json, text/javascript, */*; q=0.01",
-                    "Origin": "https://chaturbate.com",
-                    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                },
-                data={"room_slug": username, "bandwidth": "high"},
-                timeout=25,
+async def _bot_api_upload(filepath, caption, dest_chat_id, meta):
+    thumb = _thumb(meta)
+    try:
+        with open(filepath, "rb") as f, (open(thumb, "rb") if thumb else contextlib.nullcontext()) as t:
+            message = await _ptb_bot.send_video(
+                chat_id=dest_chat_id,
+                video=f,
+                caption=caption,
+                parse_mode="Markdown",
+                supports_streaming=True,
+                thumbnail=t,
+                read_timeout=300,
+                write_timeout=300,
+                connect_timeout=60,
+                **_video_kwargs(meta),
             )
-            if r.status_code == 200:
-                data = r.json()
-                return data.get("room_status", "") == "public"
-        except Exception:
-            continue
+        logger.info(f"Upload complete via PTB to {dest_chat_id}: {os.path.basename(filepath)}")
+        video = getattr(message, "video", None) or getattr(message, "document", None)
+        return {"transport": "bot_api", "file_id": video.file_id if video else None}
+    except Exception as e:
+        logger.warning(f"PTB upload of {os.path.basename(filepath)} failed: {e}")
+        return None
+
+
+async def _mtproto_upload(filepath, caption, dest_chat_id, meta):
+    checkpoint = None
+    if use_parallel_upload(os.path.getsize(filepath)):
+        checkpoint = UploadCheckpoint.load(filepath)
 
-    for target in _IMPERSONATE_TARGETS:
+    attempts = max(1, client_pool.size())
+    for attempt in range(attempts):
         try:
-            time.sleep(3)
-            session = cf_requests.Session(impersonate=target)
-            r = session.get(
-                f"https://chaturbate.com/api/chatvideocontext/{username}/",
-                headers=common_headers, timeout=25,
+            lease = await client_pool.acquire(prefer=checkpoint and checkpoint.session)
+        except Exception as e:
+            logger.error(f"Upload failed for {filepath}: {e}")
+            return None
+        try:
+            client = lease.client
+            if dest_chat_id:
+                dest = await client.get_input_entity(dest_chat_id)
+            else:
+                dest = await _resolve_dest(client)
+            if checkpoint and checkpoint.session != lease.key:
+                checkpoint.reset(lease.key)
+            # Parts acknowledged before a resume were paid for by the earlier attempt.
+            progress = upload_scheduler.progress_callback(
+                filepath, checkpoint.resumed_bytes() if checkpoint else 0,
             )
-            if r.status_code == 200:
-                data = r.json()
-                return data.get("room_status", "") == "public"
-        except Exception:
-            continue
-
+            if checkpoint:
+                media = await parallel_upload(
+                    client, filepath, progress_callback=progress, checkpoint=checkpoint,
+                )
+            else:
+                media = filepath
+            message = await client.send_file(
+                dest, media, caption=caption,
+                supports_streaming=True, progress_callback=progress,
+                attributes=_video_attributes(meta), thumb=_thumb(meta),
+            )
+        except Exception as e:
+            if checkpoint and "FILE_PART" in str(e):
+                # Telegram no longer has the checkpointed parts; start over next time.
+                checkpoint.reset(lease.key)
+                checkpoint.save()
+            if client_pool.release(lease, e) and attempt + 1 < attempts:
+                logger.warning(
+                    f"Upload of {os.path.basename(filepath)} failed on session "
+                    f"#{lease.index}, retrying on another: {e}"
+                )
+                continue
+            logger.exception(f"Upload failed for {filepath}: {e}")
+            return None
+        client_pool.release(lease)
+        if checkpoint:
+            checkpoint.remove()
+        logger.info(f"Upload complete: {os.path.basename(filepath)} (session #{lease.index})")
+        doc = getattr(getattr(message, "media", None), "document", None)
+        if doc is None:
+            return {"transport": "mtproto"}
+        return {
+            "transport": "mtproto", "session": lease.key, "id": doc.id,
+            "access_hash": doc.access_hash, "file_reference": doc.file_reference.hex(),
+        }
     return None
 
 
-def _get_hls_url(username):
-    try:
-        result = subprocess.run(
-            [YOUTUBE_DL_CMD, "--get-url", f"https://chaturbate.com/{username}/"],
-            capture_output=True, text=True, timeout=45,
-        )
-        url = result.stdout.strip().split("\n")[0]
-        if url.startswith("http"):
-            return url
-        return None
-    except Exception as e:
-        logger.exception(f"[{username}] yt-dlp error: {e}")
-        return None
+async def _is_online(username):
+    return await status_client.is_online(username)
+
+
+status_client = StatusClient(RateLimiter(PROBE_RPS))
+probe_engine = ProbeEngine(_is_online)
+room_directory = RoomDirectory(status_client.get_json)
 
 
 def recording_key(user_tid, model):
     return f"{user_tid}:{model}"
 
 
-async def start_user_recording(user_telegram_id, model_name):
-    loop = asyncio.get_event_loop()
-    hls_url = await loop.run_in_executor(None, _get_hls_url, model_name)
-    if not hls_url:
-        return None
+def capture_key(user_tid, model):
+    return model if SHARED_CAPTURE else recording_key(user_tid, model)
 
-    out_dir = os.path.join(VIDEOS_DIR, str(user_telegram_id), model_name)
-    os.makedirs(out_dir, exist_ok=True)
-    out_file = os.path.join(out_dir, "part_000.mp4")
 
-    ffmpeg_cmd = [
+def _ffmpeg_cmd(hls_url, out_file):
+    return [
         FFMPEG_CMD, "-hide_banner", "-loglevel", "error",
         "-i", hls_url, "-c", "copy", "-map", "0", out_file,
     ]
 
+
+def _segment_list_path(out_dir):
+    # The list lives in its own directory so the inotify watch on it does not
+    # also fire for every write ffmpeg makes to the segment in progress.
+    return os.path.join(out_dir, "list", "segments.txt")
+
+
+def _segmenter_cmd(hls_url, out_dir, start_number=0):
+    cmd = [
+        FFMPEG_CMD, "-hide_banner", "-loglevel", "error",
+        "-i", hls_url, "-c", "copy", "-map", "0",
+        "-f", "segment", "-segment_time", str(max(60, int(SEGMENT_SECONDS * disk_budget.segment_scale()))),
+        "-segment_start_number", str(start_number),
+        "-segment_format", "mp4", "-reset_timestamps", "1",
+        "-segment_list", _segment_list_path(out_dir),
+        "-segment_list_type", "flat",
+    ]
+    if STREAMING_UPLOAD:
+        # Fragmented MP4 is append-only, so bytes can be uploaded as soon as they are written.
+        cmd += ["-segment_format_options", "movflags=+frag_keyframe+empty_moov+default_base_moof"]
+    return cmd + [os.path.join(out_dir, "part_%03d.mp4")]
+
+
+async def _playlist_for(model_name):
+    return status_client.playlist_url(model_name) or await resolve_hls_url(model_name)
+
+
+async def _open_capture(key, model_name, hls_url=None):
+    if not hls_url:
+        hls_url = await _playlist_for(model_name)
+    if not hls_url:
+        return None
+
+    out_dir = os.path.join(CAPTURES_DIR, f"{model_name}_{int(time.time() * 1000)}")
+    os.makedirs(out_dir, exist_ok=True)
+    if SEGMENT_MODE == "muxer":
+        out_file = None
+        os.makedirs(os.path.dirname(_segment_list_path(out_dir)), exist_ok=True)
+        cmd = _segmenter_cmd(hls_url, out_dir)
+    else:
+        out_file = os.path.join(out_dir, "part_000.mp4")
+        cmd = _ffmpeg_cmd(hls_url, out_file)
+
     try:
-        proc = subprocess.Popen(ffmpeg_cmd, env=os.environ.copy())
+        proc = await FFmpegProcess.start(cmd, model_name)
     except Exception as e:
         logger.error(f"[{model_name}] Failed to start ffmpeg: {e}")
         return None
 
-    db_rec_id = start_recording_entry(user_telegram_id, model_name)
-    rec = UserRecording(user_telegram_id, model_name, out_dir, proc, out_file, db_rec_id)
-    task = asyncio.create_task(user_size_watcher(rec))
-    rec.watcher_task = task
-
-    key = recording_key(user_telegram_id, model_name)
-    active_recordings[key] = rec
-    logger.info(f"[{model_name}] Recording started for user {user_telegram_id}")
+    cap = Capture(key, model_name, out_dir, proc, out_file, hls_url)
+    proc.on_exit = cap.wakeup.set
+    if SEGMENT_MODE == "muxer":
+        list_name = os.path.basename(cap.segment_list)
+
+        def on_change(names):
+            if list_name in names:
+                cap.wakeup.set()
+
+        cap.fs_watch = watch_dir(os.path.dirname(cap.segment_list), on_change)
+    if STREAMING_UPLOAD:
+        _start_stream(cap)
+    cap.watcher_task = asyncio.create_task(capture_watcher(cap))
+    active_captures[key] = cap
+    logger.info(f"[{model_name}] Capture started ({'shared' if SHARED_CAPTURE else 'exclusive'})")
+    return cap
+
+
+async def start_user_recording(user_telegram_id, model_name, hls_url=None):
+    key = capture_key(user_telegram_id, model_name)
+    lock = _capture_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        cap = active_captures.get(key)
+        if cap is None or cap.closing:
+            cap = await _open_capture(key, model_name, hls_url)
+            if cap is None:
+                return None
+
+        out_dir = os.path.join(VIDEOS_DIR, str(user_telegram_id), model_name)
+        os.makedirs(out_dir, exist_ok=True)
+
+        db_rec_id = start_recording_entry(user_telegram_id, model_name, cap.out_dir, cap.segment_count)
+        rec = UserRecording(user_telegram_id, model_name, out_dir, cap, db_rec_id)
+        rkey = recording_key(user_telegram_id, model_name)
+        cap.subscribers[rkey] = rec
+        rec.watcher_task = asyncio.create_task(user_size_watcher(rec))
+        active_recordings[rkey] = rec
+
+    logger.info(
+        f"[{model_name}] Recording started for user {user_telegram_id} "
+        f"({len(cap.subscribers)} subscriber(s) on capture)"
+    )
     return rec
 
 
 def stop_user_recording(rec, reason="stop"):
+    if not rec.stopping:
+        logger.info(f"[{rec.model_name}] Stopping recording for user {rec.user_telegram_id} ({reason})")
     rec.stopping = True
-    if rec.ffmpeg_proc.poll() is None:
-        logger.info(f"[{rec.model_name}] Sending SIGINT ({reason})")
-        rec.ffmpeg_proc.send_signal(signal.SIGINT)
+    rec.wakeup.set()
+    rec.capture.wakeup.set()
 
 
 async def user_size_watcher(rec):
-    logger.info(f"[{rec.model_name}] Size watcher started for user {rec.user_telegram_id}")
+    logger.info(f"[{rec.model_name}] Recording watcher started for user {rec.user_telegram_id}")
+
+    await rec.wakeup.wait()
+
+    if not rec.capture.billing_paused:
+        now = time.time()
+        credit_ledger.charge(rec.user_telegram_id, now - rec.last_credit_deduct, rec.db_rec_id)
+        rec.last_credit_deduct = now
+
+    if not rec.stopping:
+        rec.stopping = True
+        rec.capture.wakeup.set()
+    await rec.released.wait()
+
+    if rec.upload_tasks:
+        await asyncio.gather(*rec.upload_tasks, return_exceptions=True)
+
+    total_duration = time.time() - rec.start_time
+    end_recording_entry(rec.db_rec_id, total_duration)
+
+    key = recording_key(rec.user_telegram_id, rec.model_name)
+    if active_recordings.get(key) is rec:
+        del active_recordings[key]
+
+    logger.info(f"[{rec.model_name}] Recording complete for user {rec.user_telegram_id}")
+    await tg_notify(
+        f"✅ *{rec.model_name}* — recording complete.",
+        chat_id=rec.user_telegram_id
+    )
+
+
+async def capture_watcher(cap):
+    logger.info(f"[{cap.model_name}] Capture watcher started")
+
+    if SEGMENT_MODE == "muxer" and cap.fs_watch:
+        timeout = LIVENESS_CHECK_SECS
+    else:
+        timeout = SIZE_CHECK_SECS
 
     while True:
-        await asyncio.sleep(SIZE_CHECK_SECS)
-        if rec.stopping:
-            break
+        try:
+            await asyncio.wait_for(cap.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        cap.wakeup.clear()
 
-        remaining = get_remaining_credits(rec.user_telegram_id)
-        if remaining <= 0:
-            logger.info(f"[{rec.model_name}] User {rec.user_telegram_id} out of credits — stopping")
-            await tg_notify(
-                f"⚠️ *Recording stopped* for `{rec.model_name}` — you have no remaining credits.\n\n"
-                f"Purchase more credits to continue recording.",
-                chat_id=rec.user_telegram_id
-            )
-            rec.stopping = True
+        leaving = [r for r in cap.subscribers.values() if r.stopping]
+        if len(leaving) == len(cap.subscribers):
             break
 
-        now = time.time()
-        elapsed_since_deduct = now - rec.last_credit_deduct
-        if elapsed_since_deduct >= CREDIT_CHECK_INTERVAL:
-            deduct_credits(rec.user_telegram_id, elapsed_since_deduct)
-            rec.last_credit_deduct = now
+        if SEGMENT_MODE == "muxer":
+            await _collect_segments(cap)
+            leaving = [r for r in cap.subscribers.values() if r.stopping]
+            shrink = disk_budget.segment_scale() < cap.segment_scale
+            if (leaving or shrink) and cap.ffmpeg_proc.running():
+                if leaving:
+                    logger.info(f"[{cap.model_name}] {len(leaving)} subscriber(s) leaving — cutting segment")
+                else:
+                    logger.info(f"[{cap.model_name}] Disk {disk_budget.state} — cutting to shorter segments")
+                await _cut_capture(cap)
+            if not cap.ffmpeg_proc.running():
+                if await _restart_capture(cap) or await _reconnect_capture(cap):
+                    continue
+                _stream_ended(cap)
+                break
+            continue
+
+        if not cap.ffmpeg_proc.running():
+            if await _restart_capture(cap) or await _reconnect_capture(cap):
+                continue
+            _stream_ended(cap)
+            break
 
-        filepath = rec.current_file
+        filepath = cap.current_file
         if not filepath or not os.path.exists(filepath):
-            if rec.ffmpeg_proc.poll() is not None:
-                break
+            _release(cap, leaving)
             continue
 
         try:
@@ -336,105 +566,514 @@ async def user_size_watcher(rec):
         except OSError:
             continue
 
-        if size >= SEGMENT_MAX_BYTES and rec.ffmpeg_proc.poll() is None:
-            logger.info(f"[{rec.model_name}] File reached {size // 1024 // 1024} MB — rotating")
-
-            loop = asyncio.get_event_loop()
-            hls_url = await loop.run_in_executor(None, _get_hls_url, rec.model_name)
-            if not hls_url:
+        if size == 0:
+            _release(cap, leaving)
+        elif size >= SEGMENT_MAX_BYTES * disk_budget.segment_scale() or leaving:
+            if not leaving:
+                logger.info(f"[{cap.model_name}] File reached {size // 1024 // 1024} MB — rotating")
+            else:
+                logger.info(f"[{cap.model_name}] {len(leaving)} subscriber(s) leaving — cutting segment")
+            if not await _rotate_capture(cap):
                 break
 
-            rec.segment_count += 1
-            new_file = os.path.join(rec.out_dir, f"part_{rec.segment_count:03d}.mp4")
+    cap.closing = True
+    _pause_billing(cap)
+    if cap.fs_watch:
+        cap.fs_watch.close()
 
-            ffmpeg_cmd = [
-                FFMPEG_CMD, "-hide_banner", "-loglevel", "error",
-                "-i", hls_url, "-c", "copy", "-map", "0", new_file,
-            ]
-            try:
-                new_proc = subprocess.Popen(ffmpeg_cmd, env=os.environ.copy())
-            except Exception:
-                break
+    await cap.ffmpeg_proc.stop(timeout=15)
 
-            old_proc = rec.ffmpeg_proc
-            old_file = filepath
-            rec.ffmpeg_proc = new_proc
-            rec.current_file = new_file
+    recs = list(cap.subscribers.values())
+    try:
+        if SEGMENT_MODE == "muxer":
+            await _collect_segments(cap)
+        else:
+            await _fanout_segment(cap.current_file, _assign_parts(recs))
+    finally:
+        cap.subscribers.clear()
+        for stream in cap.streams.values():
+            stream.cancel()
+        if cap.fanout_tasks:
+            await asyncio.gather(*cap.fanout_tasks, return_exceptions=True)
+        for rec in recs:
+            rec.released.set()
+            rec.wakeup.set()
+
+    shutil.rmtree(cap.out_dir, ignore_errors=True)
+    if active_captures.get(cap.key) is cap:
+        del active_captures[cap.key]
+    logger.info(f"[{cap.model_name}] Capture finished")
+
+
+def _pause_billing(cap):
+    """Bills subscribers up to the moment ffmpeg stopped, then stops their clock."""
+    if cap.billing_paused:
+        return
+    cap.billing_paused = True
+    proc = cap.ffmpeg_proc
+    until = time.time() if proc.running() else proc.ended_at
+    cap.paused_at = until
+    credit_ledger.charge_many([
+        (rec.user_telegram_id, max(0, until - rec.last_credit_deduct), rec.db_rec_id)
+        for rec in cap.subscribers.values()
+        if not rec.stopping
+    ])
+    for rec in cap.subscribers.values():
+        rec.last_credit_deduct = max(rec.last_credit_deduct, until)
+
+
+def _resume_billing(cap):
+    cap.billing_paused = False
+    now = time.time()
+    for rec in cap.subscribers.values():
+        rec.last_credit_deduct = now
+    # Recovery bills wall-clock time since started_at, so it needs the gaps.
+    try:
+        add_paused_seconds([
+            (rec.db_rec_id, now - max(cap.paused_at, rec.start_time))
+            for rec in cap.subscribers.values()
+        ])
+    except Exception as e:
+        logger.warning(f"[{cap.model_name}] Could not record paused time: {e}")
 
-            old_proc.send_signal(signal.SIGINT)
-            part_num = rec.segment_count
-            task = asyncio.create_task(_finalize_and_upload(rec, old_proc, old_file, part_num))
-            rec.upload_tasks.append(task)
 
-            if rec.stopping:
-                break
+def _stream_ended(cap):
+    if not all(r.stopping for r in cap.subscribers.values()):
+        _observe_transition(cap.model_name, False)
 
-        if rec.ffmpeg_proc.poll() is not None:
-            break
 
-    elapsed = time.time() - rec.last_credit_deduct
-    if elapsed > 0:
-        deduct_credits(rec.user_telegram_id, elapsed)
+def _observe_transition(model_name, online):
+    if schedule_predictor.observe(model_name, online):
+        try:
+            record_model_transition(model_name, online)
+        except Exception as e:
+            logger.warning(f"[{model_name}] Could not record status transition: {e}")
 
-    if rec.ffmpeg_proc.poll() is None:
-        rec.ffmpeg_proc.send_signal(signal.SIGINT)
-        for _ in range(15):
-            if rec.ffmpeg_proc.poll() is not None:
-                break
-            await asyncio.sleep(1)
 
-    if rec.current_file and os.path.exists(rec.current_file):
-        size = os.path.getsize(rec.current_file)
-        if size > 0:
-            await _upload_and_delete(rec, rec.current_file, rec.segment_count + 1)
+def _release(cap, recs):
+    for rec in recs:
+        cap.subscribers.pop(recording_key(rec.user_telegram_id, rec.model_name), None)
+        rec.released.set()
+        rec.wakeup.set()
 
-    if rec.upload_tasks:
-        await asyncio.gather(*rec.upload_tasks, return_exceptions=True)
 
-    total_duration = time.time() - rec.start_time
-    end_recording_entry(rec.db_rec_id, total_duration)
+def _completed_segments(cap):
+    try:
+        with open(cap.segment_list, "rb") as f:
+            f.seek(cap.list_offset)
+            data = f.read()
+    except FileNotFoundError:
+        return []
+
+    end = data.rfind(b"\n")
+    if end < 0:
+        return []
+    cap.list_offset += end + 1
+    names = [line.strip().decode() for line in data[:end].split(b"\n") if line.strip()]
+    return [os.path.join(cap.out_dir, os.path.basename(name)) for name in names]
+
+
+def _start_stream(cap):
+    path = os.path.join(cap.out_dir, f"part_{cap.segment_count:03d}.mp4")
+    cap.streams[path] = StreamingUpload(path, client_pool).start()
+
+
+async def _collect_segments(cap):
+    for filepath in _completed_segments(cap):
+        cap.segment_count += 1
+        deliveries = _assign_parts(cap.subscribers.values())
+        stream = cap.streams.pop(filepath, None)
+        if stream:
+            if not cap.closing:
+                _start_stream(cap)
+            stream.close()
+            task = asyncio.create_task(_deliver_stream(stream, filepath, deliveries))
+            for rec, _ in deliveries:
+                rec.upload_tasks.append(task)
+        elif POSTPROCESS:
+            # Remuxing takes a while; keep it off the capture watcher's loop.
+            fanout = asyncio.create_task(_fanout_segment(filepath, deliveries))
+            cap.fanout_tasks.append(fanout)
+            task = asyncio.create_task(_wait_for_fanout(fanout))
+            for rec, _ in deliveries:
+                rec.upload_tasks.append(task)
+        else:
+            await _fanout_segment(filepath, deliveries)
+        # Subscribers that asked to stop leave once the segment they were in closes.
+        _release(cap, [r for r in cap.subscribers.values() if r.stopping])
 
-    key = recording_key(rec.user_telegram_id, rec.model_name)
-    active_recordings.pop(key, None)
 
-    logger.info(f"[{rec.model_name}] Recording complete for user {rec.user_telegram_id}")
-    await tg_notify(
-        f"✅ *{rec.model_name}* — recording complete.",
-        chat_id=rec.user_telegram_id
+def _assign_parts(recs):
+    deliveries = []
+    for rec in recs:
+        rec.segment_count += 1
+        deliveries.append((rec, rec.segment_count))
+    return deliveries
+
+
+async def _restart_capture(cap):
+    """Restarts ffmpeg after a transient HLS error, on the playlist URL the capture already has."""
+    proc = cap.ffmpeg_proc
+    if cap.closing or not proc.transient_failure():
+        return False
+    if proc.uptime() >= FFMPEG_STABLE_SECS:
+        cap.restarts = 0
+    if cap.restarts >= FFMPEG_MAX_RESTARTS:
+        logger.warning(f"[{cap.model_name}] ffmpeg keeps failing — giving up after {cap.restarts} restarts")
+        return False
+    cap.restarts += 1
+    delay = min(30, 2 ** cap.restarts)
+    logger.warning(
+        f"[{cap.model_name}] ffmpeg exited with {proc.returncode} on a transient error — "
+        f"restart {cap.restarts}/{FFMPEG_MAX_RESTARTS} in {delay}s"
     )
+    _pause_billing(cap)
+    try:
+        await asyncio.sleep(delay)
+        return await _respawn_capture(cap, cap.hls_url)
+    finally:
+        if not cap.closing:
+            _resume_billing(cap)
 
 
-async def _finalize_and_upload(rec, proc, filepath, part_num):
-    for _ in range(30):
-        if proc.poll() is not None:
-            break
-        await asyncio.sleep(1)
-    else:
-        proc.kill()
+async def _reconnect_capture(cap):
+    """Re-probes a model whose stream dropped and resumes the same capture if it returns.
 
-    if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-        await _upload_and_delete(rec, filepath, part_num)
+    Subscribers keep their recording row and part numbering; the gap is not billed.
+    """
+    if cap.closing or RECONNECT_GRACE_SECS <= 0:
+        return False
+    if SEGMENT_MODE == "muxer":
+        await _collect_segments(cap)
+    if not cap.subscribers or all(r.stopping for r in cap.subscribers.values()):
+        return False
+
+    logger.info(f"[{cap.model_name}] Stream dropped — trying to reconnect for up to {RECONNECT_GRACE_SECS}s")
+    _pause_billing(cap)
+    deadline = time.monotonic() + RECONNECT_GRACE_SECS
+    delay = 2
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.info(f"[{cap.model_name}] Did not come back within {RECONNECT_GRACE_SECS}s")
+                return False
+            try:
+                await asyncio.wait_for(cap.wakeup.wait(), min(delay, remaining))
+            except asyncio.TimeoutError:
+                pass
+            cap.wakeup.clear()
+            if all(r.stopping for r in cap.subscribers.values()):
+                return False
+
+            probe_engine.invalidate(cap.model_name)
+            if await probe_engine.probe(cap.model_name):
+                hls_url = (
+                    status_client.playlist_url(cap.model_name)
+                    or await resolve_hls_url(cap.model_name, fresh=True)
+                )
+                if hls_url and await _respawn_capture(cap, hls_url):
+                    cap.restarts = 0
+                    logger.info(f"[{cap.model_name}] Reconnected — resuming capture")
+                    return True
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+    finally:
+        if not cap.closing:
+            _resume_billing(cap)
+
+
+async def _respawn_capture(cap, hls_url):
+    if SEGMENT_MODE != "muxer":
+        return await _rotate_capture(cap, hls_url)
+
+    # Hand off whatever the dead process finished, then continue the numbering
+    # in a fresh segment list.
+    await _collect_segments(cap)
+    try:
+        os.remove(cap.segment_list)
+    except FileNotFoundError:
+        pass
+    cap.list_offset = 0
+    try:
+        new_proc = await FFmpegProcess.start(
+            _segmenter_cmd(hls_url, cap.out_dir, start_number=cap.segment_count), cap.model_name,
+        )
+    except Exception as e:
+        logger.error(f"[{cap.model_name}] Failed to restart ffmpeg: {e}")
+        return False
+    new_proc.on_exit = cap.wakeup.set
+    cap.ffmpeg_proc = new_proc
+    cap.hls_url = hls_url
+    cap.segment_scale = disk_budget.segment_scale()
+    return True
 
 
-async def _upload_and_delete(rec, filepath, part_num):
-    size_mb = os.path.getsize(filepath) / 1024 ** 2
-    caption = (
-        f"🎬 *{rec.model_name}* — Part {part_num}\n"
-        f"({size_mb:.0f} MB)"
-    )
-    ok = await tg_upload(filepath, caption, dest_chat_id=rec.user_telegram_id)
-    if ok:
+async def _cut_capture(cap):
+    """Closes the segment the muxer is writing so leaving subscribers get their last part now."""
+    hls_url = await _playlist_for(cap.model_name) or cap.hls_url
+    await cap.ffmpeg_proc.stop(timeout=15)
+    return await _respawn_capture(cap, hls_url)
+
+
+async def _rotate_capture(cap, hls_url=None):
+    hls_url = hls_url or await _playlist_for(cap.model_name)
+    if not hls_url:
+        return False
+
+    new_file = os.path.join(cap.out_dir, f"part_{cap.segment_count + 1:03d}.mp4")
+    try:
+        new_proc = await FFmpegProcess.start(_ffmpeg_cmd(hls_url, new_file), cap.model_name)
+    except Exception:
+        return False
+    cap.segment_count += 1
+    cap.hls_url = hls_url
+
+    old_proc = cap.ffmpeg_proc
+    old_file = cap.current_file
+    old_proc.on_exit = None
+    new_proc.on_exit = cap.wakeup.set
+    cap.ffmpeg_proc = new_proc
+    cap.current_file = new_file
+
+    deliveries = _assign_parts(cap.subscribers.values())
+    leaving = [r for r in cap.subscribers.values() if r.stopping]
+    for rec in leaving:
+        cap.subscribers.pop(recording_key(rec.user_telegram_id, rec.model_name), None)
+
+    task = asyncio.create_task(_finalize_and_fanout(old_proc, old_file, deliveries, leaving))
+    cap.fanout_tasks.append(task)
+    return True
+
+
+async def _finalize_and_fanout(proc, filepath, deliveries, leaving):
+    try:
+        await proc.stop(timeout=30)
+        await _fanout_segment(filepath, deliveries)
+    finally:
+        for rec in leaving:
+            rec.released.set()
+            rec.wakeup.set()
+
+
+async def _fanout_segment(filepath, deliveries):
+    tasks = []
+    if not filepath or not os.path.exists(filepath):
+        return tasks
+    if os.path.getsize(filepath) == 0:
+        os.remove(filepath)
+        return tasks
+
+    meta = await postprocess_segment(filepath)
+    thumb = _thumb(meta)
+    for rec, part_num in deliveries:
+        dest = os.path.join(rec.out_dir, f"{rec.db_rec_id}_part_{part_num:03d}.mp4")
+        try:
+            _link_or_copy(filepath, dest)
+        except OSError as e:
+            logger.error(f"[{rec.model_name}] Could not hand segment to user {rec.user_telegram_id}: {e}")
+            continue
+        rec_meta = meta
+        if thumb:
+            try:
+                _link_or_copy(thumb, dest[:-4] + ".jpg")
+                rec_meta = dict(meta, thumb=dest[:-4] + ".jpg")
+            except OSError:
+                rec_meta = dict(meta, thumb=None)
+        task = _queue_upload(
+            rec.user_telegram_id, rec.model_name, dest, part_num, final=rec.stopping, meta=rec_meta,
+        )
+        rec.upload_tasks.append(task)
+        tasks.append(task)
+
+    for path in (filepath, thumb):
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return tasks
+
+
+def _link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+async def _wait_for_fanout(fanout):
+    tasks = await fanout
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _deliver_stream(stream, filepath, deliveries):
+    input_file = await stream.result()
+    if input_file is None:
+        tasks = await _fanout_segment(filepath, deliveries)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return
+
+    size = os.path.getsize(filepath)
+    lease = stream.lease
+    message = None
+    failed = []
+    error = None
+    for rec, part_num in deliveries:
+        try:
+            dest = await lease.client.get_input_entity(rec.user_telegram_id)
+            sent = await lease.client.send_file(
+                dest, message.media if message else input_file,
+                caption=_part_caption(rec.model_name, part_num, size), supports_streaming=True,
+            )
+            message = message or sent
+            logger.info(f"[{rec.model_name}] Streamed part {part_num} delivered to {rec.user_telegram_id}")
+        except Exception as e:
+            logger.warning(f"[{rec.model_name}] Sending streamed part {part_num} failed: {e}")
+            failed.append((rec, part_num))
+            error = e
+    client_pool.release(lease, error)
+
+    if failed:
+        tasks = await _fanout_segment(filepath, failed)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    else:
         try:
             os.remove(filepath)
-        except Exception:
+        except OSError:
             pass
-    else:
-        await tg_notify(
-            f"⚠️ Upload failed for *{rec.model_name}*: `{os.path.basename(filepath)}`",
-            chat_id=rec.user_telegram_id
+
+
+def _part_caption(model_name, part_num, size):
+    return (
+        f"🎬 *{model_name}* — Part {part_num}\n"
+        f"({size / 1024 ** 2:.0f} MB)"
+    )
+
+
+def _remove_delivered(filepath, meta):
+    # A partial upload's checkpoint is moot once the file went out by reference.
+    for path in (filepath, filepath + CHECKPOINT_SUFFIX, _thumb(meta)):
+        if path:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+
+
+async def _upload_and_delete(uid, model_name, filepath, part_num, meta=None, digest=None):
+    if not os.path.exists(filepath):
+        return True
+    caption = _part_caption(model_name, part_num, os.path.getsize(filepath))
+    ok = await tg_upload(filepath, caption, dest_chat_id=uid, meta=meta, digest=digest)
+    if ok:
+        _remove_delivered(filepath, meta)
+    return ok
+
+
+async def _deliver(uid, model_name, filepath, part_num, final, meta):
+    """Hands a segment to the upload scheduler.
+
+    Content that is already uploaded, or being uploaded for another subscriber,
+    is waited for and sent by reference here so it never occupies a worker.
+    """
+    if not UPLOAD_DEDUP or not os.path.exists(filepath):
+        return await upload_scheduler.submit(
+            uid, filepath,
+            functools.partial(_upload_and_delete, uid, model_name, filepath, part_num, meta),
+            final=final,
+        )
+    digest = await upload_cache.digest(filepath)
+    async with upload_cache.claim(digest):
+        caption = _part_caption(model_name, part_num, os.path.getsize(filepath))
+        if await _send_cached(digest, filepath, caption, uid):
+            _remove_delivered(filepath, meta)
+            return True
+        return await upload_scheduler.submit(
+            uid, filepath,
+            functools.partial(_upload_and_delete, uid, model_name, filepath, part_num, meta, digest),
+            final=final,
         )
 
 
+def _queue_upload(uid, model_name, filepath, part_num, final=False, notify=True, meta=None):
+    _queued_uploads.add(filepath)
+    disk_budget.add(uid, filepath)
+    return asyncio.create_task(
+        _upload_with_retries(uid, model_name, filepath, part_num, final, notify, meta)
+    )
+
+
+async def _upload_with_retries(uid, model_name, filepath, part_num, final, notify, meta):
+    try:
+        for attempt in range(UPLOAD_RETRIES + 1):
+            if attempt:
+                delay = UPLOAD_RETRY_BACKOFF * 2 ** (attempt - 1)
+                logger.info(f"[{model_name}] Retrying {os.path.basename(filepath)} in {delay}s")
+                await asyncio.sleep(delay)
+            ok = await _deliver(uid, model_name, filepath, part_num, final, meta)
+            if ok:
+                return True
+        # The file stays on disk with its checkpoint; the orphan sweep resumes it later.
+        if notify:
+            await tg_notify(
+                f"⚠️ Upload failed for *{model_name}*: `{os.path.basename(filepath)}` — "
+                f"it will be retried automatically.",
+                chat_id=uid
+            )
+        return False
+    finally:
+        _queued_uploads.discard(filepath)
+        disk_budget.remove(filepath)
+
+
+def _orphan_part_num(name):
+    """Part number from `<rec_id>_part_NNN.mp4`, or from a pre-capture `part_NNN.mp4`."""
+    try:
+        if name.startswith("part_"):
+            # The old per-user layout started at part_000 and captioned it Part 1.
+            return int(name[len("part_"):-len(".mp4")]) + 1
+        if "_part_" in name:
+            return int(name[:-len(".mp4")].rsplit("_part_", 1)[1])
+    except ValueError:
+        pass
+    return None
+
+
+def _orphaned_uploads():
+    for uid in os.listdir(VIDEOS_DIR):
+        user_dir = os.path.join(VIDEOS_DIR, uid)
+        if not uid.isdigit() or not os.path.isdir(user_dir):
+            continue
+        for model_name in os.listdir(user_dir):
+            model_dir = os.path.join(user_dir, model_name)
+            if not os.path.isdir(model_dir):
+                continue
+            for name in sorted(os.listdir(model_dir)):
+                path = os.path.join(model_dir, name)
+                if not name.endswith(".mp4") or path in _queued_uploads:
+                    continue
+                part_num = _orphan_part_num(name)
+                if part_num is None:
+                    continue
+                thumb = path[:-4] + ".jpg"
+                meta = {"thumb": thumb} if os.path.exists(thumb) else None
+                yield int(uid), model_name, path, part_num, meta
+
+
+async def orphan_uploader():
+    """Re-queues segment files left on disk by failed uploads or a previous run."""
+    while True:
+        try:
+            orphans = list(_orphaned_uploads())
+            if orphans:
+                logger.info(f"Re-queuing {len(orphans)} orphaned segment upload(s)")
+            for uid, model_name, path, part_num, meta in orphans:
+                _queue_upload(uid, model_name, path, part_num, notify=False, meta=meta)
+        except Exception as e:
+            logger.exception(f"Orphan sweep failed: {e}")
+        await asyncio.sleep(ORPHAN_SWEEP_SECS)
+
+
 def get_user_active_recordings(user_telegram_id):
     results = []
     for key, rec in active_recordings.items():
@@ -443,19 +1082,267 @@ def get_user_active_recordings(user_telegram_id):
     return results
 
 
+async def _charge_active_recordings():
+    recs_by_user = {}
+    charges = []
+    now = time.time()
+    for rec in list(active_recordings.values()):
+        if rec.stopping:
+            continue
+        if rec.capture.billing_paused:
+            # Nothing is being recorded while the stream is down or the capture is closing.
+            rec.last_credit_deduct = now
+            continue
+        charges.append((rec.user_telegram_id, now - rec.last_credit_deduct, rec.db_rec_id))
+        rec.last_credit_deduct = now
+        recs_by_user.setdefault(rec.user_telegram_id, []).append(rec)
+    credit_ledger.charge_many(charges)
+
+    for uid, recs in recs_by_user.items():
+        if credit_ledger.remaining(uid) > 0:
+            continue
+        for rec in recs:
+            logger.info(f"[{rec.model_name}] User {uid} out of credits — stopping")
+            stop_user_recording(rec, reason="out of credits")
+            await tg_notify(
+                f"⚠️ *Recording stopped* for `{rec.model_name}` — you have no remaining credits.\n\n"
+                f"Purchase more credits to continue recording.",
+                chat_id=uid
+            )
+
+
+async def credit_timer():
+    while True:
+        await asyncio.sleep(CREDIT_CHECK_INTERVAL)
+        try:
+            await _charge_active_recordings()
+        except Exception as e:
+            logger.exception(f"Credit timer error: {e}")
+
+
+async def _start_and_notify(uid, model):
+    rec = await start_user_recording(uid, model, status_client.playlist_url(model))
+    if rec:
+        await tg_notify(
+            f"🔴 *{model}* is live — recording started.\n"
+            f"Files will be uploaded automatically.",
+            chat_id=uid
+        )
+
+
+def _playable(filepath):
+    """True if the MP4 has a moov (or fragment) box; a capture killed mid-write has neither."""
+    try:
+        size = os.path.getsize(filepath)
+        with open(filepath, "rb") as f:
+            offset = 0
+            while offset + 8 <= size:
+                f.seek(offset)
+                header = f.read(16)
+                box_size = int.from_bytes(header[:4], "big")
+                box_type = header[4:8]
+                if box_type in (b"moov", b"moof"):
+                    return True
+                if box_size == 1:
+                    box_size = int.from_bytes(header[8:16], "big")
+                elif box_size == 0:
+                    break
+                if box_size < 8:
+                    break
+                offset += box_size
+    except OSError:
+        pass
+    return False
+
+
+def _latest_mtime(paths):
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    return max(mtimes, default=None)
+
+
+def _recover_capture_dir(capture_dir, rows):
+    """Hands the segments a crashed capture never fanned out to its subscribers."""
+    names = sorted(n for n in os.listdir(capture_dir) if n.startswith("part_") and n.endswith(".mp4"))
+    recovered = 0
+    for name in names:
+        filepath = os.path.join(capture_dir, name)
+        if os.path.getsize(filepath) == 0 or not _playable(filepath):
+            logger.info(f"Dropping unfinished segment {filepath}")
+            continue
+        try:
+            index = int(name[len("part_"):-len(".mp4")])
+        except ValueError:
+            continue
+        for row in rows:
+            part_num = index + 1 - (row["part_offset"] or 0)
+            if part_num < 1:
+                continue
+            out_dir = os.path.join(VIDEOS_DIR, str(row["user_telegram_id"]), row["model_name"])
+            dest = os.path.join(out_dir, f"{row['id']}_part_{part_num:03d}.mp4")
+            if os.path.exists(dest):
+                continue
+            try:
+                os.makedirs(out_dir, exist_ok=True)
+                _link_or_copy(filepath, dest)
+                recovered += 1
+            except OSError as e:
+                logger.error(f"Could not recover {filepath} for recording {row['id']}: {e}")
+    return recovered
+
+
+async def recover_state():
+    """Reconciles recordings left in status='recording' by a crash or restart.
+
+    Completed segments still in a capture directory are handed to their
+    subscribers, and the orphan sweep uploads those and any segments of the
+    older per-user layout. Recorded time that was never billed is charged,
+    the rows are closed as 'interrupted', and the models are queued for an
+    immediate re-probe when the recorder loop starts.
+    """
+    credit_ledger.load()
+    stale = [row for row in get_all_active_recordings() if row["id"] not in
+             {rec.db_rec_id for rec in active_recordings.values()}]
+
+    by_capture = {}
+    for row in stale:
+        if row["capture_dir"]:
+            by_capture.setdefault(row["capture_dir"], []).append(row)
+
+    capture_mtimes = {}
+    recovered = 0
+    if os.path.isdir(CAPTURES_DIR):
+        for name in os.listdir(CAPTURES_DIR):
+            capture_dir = os.path.join(CAPTURES_DIR, name)
+            if not os.path.isdir(capture_dir) or any(
+                cap.out_dir == capture_dir for cap in active_captures.values()
+            ):
+                continue
+            capture_mtimes[capture_dir] = _latest_mtime(
+                os.path.join(capture_dir, n) for n in os.listdir(capture_dir)
+            )
+            try:
+                recovered += _recover_capture_dir(capture_dir, by_capture.get(capture_dir, []))
+            except OSError as e:
+                logger.error(f"Recovering {capture_dir} failed: {e}")
+            shutil.rmtree(capture_dir, ignore_errors=True)
+
+    for row in stale:
+        uid, model_name = row["user_telegram_id"], row["model_name"]
+        started = datetime.fromisoformat(row["started_at"]).replace(tzinfo=timezone.utc).timestamp()
+        user_dir = os.path.join(VIDEOS_DIR, str(uid), model_name)
+        # Rows from before shared captures have no capture_dir and recorded
+        # straight into the user directory as part_NNN.mp4.
+        prefix = f"{row['id']}_part_" if row["capture_dir"] else "part_"
+        user_files = []
+        if os.path.isdir(user_dir):
+            user_files = [os.path.join(user_dir, n) for n in os.listdir(user_dir) if n.startswith(prefix)]
+        last_seen = max(
+            [t for t in (capture_mtimes.get(row["capture_dir"]), _latest_mtime(user_files)) if t],
+            default=started,
+        )
+        recorded = max(0, last_seen - started - (row["paused_seconds"] or 0))
+        unbilled = recorded - (row["billed_seconds"] or 0)
+        if unbilled > 0:
+            credit_ledger.charge(uid, unbilled, row["id"])
+        end_recording_entry(row["id"], recorded, status="interrupted")
+        _recovered.append((uid, model_name))
+        logger.info(
+            f"[{model_name}] Recording {row['id']} for user {uid} interrupted: "
+            f"{recorded:.0f}s recorded, {max(0, unbilled):.0f}s billed on recovery"
+        )
+        await tg_notify(
+            f"⚠️ *{model_name}* — recording was interrupted by a restart. "
+            f"Parts already captured will still be uploaded.",
+            chat_id=uid
+        )
+
+    if stale or recovered:
+        logger.info(f"Recovered {len(stale)} interrupted recording(s), {recovered} leftover segment(s)")
+
+
+async def _reattach_recovered():
+    pairs = list(dict.fromkeys(_recovered))
+    _recovered.clear()
+    monitored = {(row["user_telegram_id"], row["model_name"]) for row in get_all_monitored_models()}
+    pairs = [
+        (uid, model) for uid, model in pairs
+        if (uid, model) in monitored and credit_ledger.remaining(uid) > 0
+        and recording_key(uid, model) not in active_recordings
+    ]
+    if not pairs:
+        return
+    statuses = await probe_engine.sweep([model for _, model in pairs])
+    starts = [_start_and_notify(uid, model) for uid, model in pairs if statuses.get(model)]
+    logger.info(f"Re-attaching {len(starts)} of {len(pairs)} interrupted recording(s)")
+    await asyncio.gather(*starts, return_exceptions=True)
+
+
+def _on_disk_pressure(state):
+    # Under pressure uploads get the whole link and extra workers so the
+    # backlog drains faster.
+    upload_scheduler.limiter.unlimited = state != OK
+    upload_scheduler.resize(UPLOAD_WORKERS + (UPLOAD_PRESSURE_WORKERS if state != OK else 0))
+    # Running segmenters only read the segment length at spawn; their watchers
+    # cut and respawn them when it shrinks.
+    for cap in active_captures.values():
+        cap.wakeup.set()
+
+
+def _seed_scheduler():
+    history = {}
+    for row in get_last_live_times():
+        if row["last_live"]:
+            history[row["model_name"]] = (
+                datetime.fromisoformat(row["last_live"]).replace(tzinfo=timezone.utc).timestamp()
+            )
+    model_scheduler.seed(history)
+
+    cutoff = time.time() - PREDICT_WEEKS * WEEK_SECS
+    since = datetime.fromtimestamp(cutoff, timezone.utc).replace(tzinfo=None).isoformat()
+    prune_model_transitions(since)
+    schedule_predictor.load(
+        (row["model_name"], bool(row["online"]),
+         datetime.fromisoformat(row["at"]).replace(tzinfo=timezone.utc).timestamp())
+        for row in get_model_transitions(since)
+    )
+
+
 async def recorder_loop():
     logger.info("RecordBot recorder loop started.")
+    credit_ledger.load()
+    try:
+        _seed_scheduler()
+    except Exception as e:
+        logger.warning(f"Could not seed the poll scheduler from history: {e}")
+    asyncio.create_task(credit_timer())
+    asyncio.create_task(ledger_flusher())
+    client_pool.start()
+    asyncio.create_task(orphan_uploader())
+    asyncio.create_task(disk_monitor(disk_budget, _on_disk_pressure))
+    try:
+        await _reattach_recovered()
+    except Exception as e:
+        logger.exception(f"Re-attaching interrupted recordings failed: {e}")
     while True:
         try:
+            sweep_started = time.time()
             done_keys = [
                 key for key, rec in active_recordings.items()
-                if rec.ffmpeg_proc.poll() is not None
-                and rec.watcher_task is not None
+                if rec.watcher_task is not None
                 and rec.watcher_task.done()
             ]
             for key in done_keys:
                 del active_recordings[key]
 
+            for cap in active_captures.values():
+                model_scheduler.mark_live(cap.model_name)
+                _observe_transition(cap.model_name, True)
+
             monitored = get_all_monitored_models()
 
             models_by_user = {}
@@ -465,32 +1352,57 @@ async def recorder_loop():
                     models_by_user[uid] = []
                 models_by_user[uid].append(row["model_name"])
 
+            pending = []
+            demand = {}
+            deferred = 0
             for uid, models in models_by_user.items():
-                credits = get_remaining_credits(uid)
+                credits = credit_ledger.remaining(uid)
                 if credits <= 0:
                     continue
+                if not disk_budget.admit(uid):
+                    deferred += len(models)
+                    continue
 
                 for model in models:
                     key = recording_key(uid, model)
                     if key in active_recordings:
                         continue
-
-                    logger.info(f"Checking {model} for user {uid}...")
-                    loop = asyncio.get_event_loop()
-                    online = await loop.run_in_executor(None, _is_online, model)
-
-                    if online:
-                        rec = await start_user_recording(uid, model)
-                        if rec:
-                            await tg_notify(
-                                f"🔴 *{model}* is live — recording started.\n"
-                                f"Files will be uploaded automatically.",
-                                chat_id=uid
-                            )
-
-                    await asyncio.sleep(RATE_LIMIT_TIME)
-
-            await asyncio.sleep(POLL_INTERVAL)
+                    pending.append((uid, model))
+                    subscribers, weight_credits = demand.get(model, (0, 0))
+                    demand[model] = (subscribers + 1, weight_credits + credits)
+            if deferred:
+                logger.info(f"Disk pressure {disk_budget.state}: deferring up to {deferred} new recording(s)")
+
+            if demand and DISCOVERY and await room_directory.refresh():
+                # One listing covers every model: only confirm the ones it shows live.
+                due = {model for model in demand if room_directory.is_live(model)}
+                for model in demand:
+                    if model not in due:
+                        _observe_transition(model, False)
+                        model_scheduler.record(model, False)
+            else:
+                due = set(model_scheduler.due(demand)) if demand else set()
+            if due:
+                statuses = await probe_engine.sweep([model for _, model in pending if model in due])
+                for model in due:
+                    if statuses.get(model) is not None:
+                        _observe_transition(model, statuses[model])
+                    model_scheduler.record(model, statuses.get(model))
+                starts = [
+                    _start_and_notify(uid, model)
+                    for uid, model in pending
+                    if model in due
+                    and statuses.get(model)
+                    and recording_key(uid, model) not in active_recordings
+                ]
+                if starts:
+                    await asyncio.gather(*starts, return_exceptions=True)
+
+            elapsed = time.time() - sweep_started
+            delay = POLL_INTERVAL - elapsed
+            if demand:
+                delay = min(delay, model_scheduler.next_wakeup(demand))
+            await asyncio.sleep(max(RATE_LIMIT_TIME, delay))
 
         except Exception as e:
             logger.exception(f"Recorder loop error: {e}")
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import yt_dlp
+    YTDLP_AVAILABLE = True
+except ImportError:
+    YTDLP_AVAILABLE = False
+
+logger = logging.getLogger("RecordBot.Resolver")
+
+YOUTUBE_DL_CMD = os.environ.get("YOUTUBE_DL_CMD", "yt-dlp")
+RESOLVER_THREADS = int(os.environ.get("RESOLVER_THREADS", "2"))
+RESOLVER_CACHE_TTL = float(os.environ.get("RESOLVER_CACHE_TTL", "30"))
+
+YDL_OPTIONS = {
+    "quiet": True,
+    "no_warnings": True,
+    "skip_download": True,
+    "noplaylist": True,
+}
+
+_executor = ThreadPoolExecutor(max_workers=RESOLVER_THREADS, thread_name_prefix="resolver")
+_local = threading.local()
+_cache = {}
+
+
+def _extractor():
+    # YoutubeDL is not thread-safe, so each resolver thread keeps its own
+    # instance alive instead of paying extractor setup on every call.
+    ydl = getattr(_local, "ydl", None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(YDL_OPTIONS)
+        _local.ydl = ydl
+    return ydl
+
+
+def _extract_in_process(username):
+    info = _extractor().extract_info(f"https://chaturbate.com/{username}/", download=False)
+    if info.get("url"):
+        return info["url"]
+    for fmt in info.get("requested_formats") or []:
+        if fmt.get("url"):
+            return fmt["url"]
+    return None
+
+
+def _extract_subprocess(username):
+    result = subprocess.run(
+        [YOUTUBE_DL_CMD, "--get-url", f"https://chaturbate.com/{username}/"],
+        capture_output=True, text=True, timeout=45,
+    )
+    return result.stdout.strip().split("\n")[0]
+
+
+def _resolve(username):
+    try:
+        if YTDLP_AVAILABLE:
+            url = _extract_in_process(username)
+        else:
+            url = _extract_subprocess(username)
+        if url and url.startswith("http"):
+            return url
+        return None
+    except Exception as e:
+        logger.warning(f"[{username}] yt-dlp error: {e}")
+        return None
+
+
+async def resolve_hls_url(username, fresh=False):
+    entry = _cache.get(username)
+    if entry and not fresh and time.monotonic() - entry[0] < RESOLVER_CACHE_TTL:
+        return entry[1]
+
+    loop = asyncio.get_event_loop()
+    url = await loop.run_in_executor(_executor, _resolve, username)
+    if url:
+        _cache[username] = (time.monotonic(), url)
+    else:
+        _cache.pop(username, None)
+    return url
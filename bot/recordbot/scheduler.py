@@ -0,0 +1,134 @@
+import logging
+import math
+import os
+import time
+
+from bot.recordbot.predictor import schedule_predictor
+
+logger = logging.getLogger("RecordBot.Scheduler")
+
+SCHED_BASE_SECS = float(os.environ.get("SCHED_BASE_SECS", "60"))
+SCHED_MIN_SECS = float(os.environ.get("SCHED_MIN_SECS", "20"))
+SCHED_MAX_SECS = float(os.environ.get("SCHED_MAX_SECS", "900"))
+SCHED_MAX_PER_SWEEP = int(os.environ.get("SCHED_MAX_PER_SWEEP", "0"))
+SCHED_RECENT_SECS = 6 * 3600
+SCHED_DORMANT_SECS = 7 * 86400
+SCHED_RATE_ALPHA = 0.05
+CREDIT_WEIGHT_SECS = 20 * 3600
+PREDICT_BACKOFF = 2
+
+
+class ModelState:
+    __slots__ = ("first_seen", "last_online", "live_rate", "next_check", "weight")
+
+    def __init__(self, now):
+        self.first_seen = now
+        self.last_online = None
+        self.live_rate = 0.0
+        self.next_check = 0.0
+        self.weight = 1.0
+
+
+class ModelScheduler:
+    """Per-model next-check times from online history.
+
+    Recently live models are polled every SCHED_BASE_SECS; the interval stretches
+    towards SCHED_MAX_SECS the longer a model stays dormant. Subscribers and
+    credits divide the interval, never below SCHED_MIN_SECS. Models with a
+    learned schedule are probed at SCHED_MIN_SECS inside their predicted start
+    windows and backed off outside them.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.last_due = 0
+        self.last_tracked = 0
+
+    def _state(self, model, now=None):
+        st = self.models.get(model)
+        if st is None:
+            st = self.models[model] = ModelState(now or time.time())
+        return st
+
+    def seed(self, last_online):
+        """Primes `last_online` from persisted history (model → unix time)."""
+        for model, ts in last_online.items():
+            st = self._state(model)
+            if ts and (st.last_online is None or ts > st.last_online):
+                st.last_online = ts
+
+    @staticmethod
+    def weight(subscribers, credit_seconds):
+        return 1 + math.log2(max(1, subscribers)) + min(1.0, credit_seconds / CREDIT_WEIGHT_SECS)
+
+    def interval(self, model, now=None):
+        now = now or time.time()
+        st = self._state(model, now)
+        predicted = schedule_predictor.has_history(model, now)
+        if predicted and schedule_predictor.in_window(model, now):
+            return SCHED_MIN_SECS
+        since = now - (st.last_online or st.first_seen)
+        if since < SCHED_RECENT_SECS:
+            base = SCHED_BASE_SECS
+        else:
+            dormant = min(1.0, (since - SCHED_RECENT_SECS) / SCHED_DORMANT_SECS)
+            base = SCHED_BASE_SECS + (SCHED_MAX_SECS - SCHED_BASE_SECS) * dormant
+        # Models that are live often get checked up to twice as often.
+        base *= 1 - 0.5 * min(1.0, st.live_rate * 4)
+        if predicted:
+            base *= PREDICT_BACKOFF
+        interval = min(SCHED_MAX_SECS, max(SCHED_MIN_SECS, base / st.weight))
+        if predicted:
+            ahead = schedule_predictor.until_window(model, now, interval)
+            if ahead is not None:
+                interval = max(SCHED_MIN_SECS, ahead)
+        return interval
+
+    def due(self, demand, now=None):
+        """Returns the models from `demand` (model → (subscribers, credit_seconds)) due for a check.
+
+        Most overdue-by-weight first, capped at SCHED_MAX_PER_SWEEP when set.
+        """
+        now = now or time.time()
+        ready = []
+        for model, (subscribers, credits) in demand.items():
+            st = self._state(model, now)
+            st.weight = self.weight(subscribers, credits)
+            if st.next_check <= now:
+                ready.append(((now - st.next_check) * st.weight, model))
+        ready.sort(reverse=True)
+        models = [model for _, model in ready]
+        if SCHED_MAX_PER_SWEEP:
+            models = models[:SCHED_MAX_PER_SWEEP]
+        self.last_due = len(models)
+        self.last_tracked = len(demand)
+        return models
+
+    def record(self, model, online, now=None):
+        """Feeds back a probe result and schedules the model's next check."""
+        now = now or time.time()
+        st = self._state(model, now)
+        if online is None:
+            st.next_check = now + SCHED_MIN_SECS
+            return
+        st.live_rate += SCHED_RATE_ALPHA * ((1.0 if online else 0.0) - st.live_rate)
+        if online:
+            st.last_online = now
+        st.next_check = now + self.interval(model, now)
+
+    def mark_live(self, model, now=None):
+        self._state(model, now).last_online = now or time.time()
+
+    def next_wakeup(self, models, now=None):
+        """Seconds until the earliest of `models` is due (0 if one already is)."""
+        now = now or time.time()
+        pending = [self.models[m].next_check for m in models if m in self.models]
+        if not pending:
+            return 0.0
+        return max(0.0, min(pending) - now)
+
+    def metrics(self):
+        return {"tracked": self.last_tracked, "due": self.last_due}
+
+
+model_scheduler = ModelScheduler()
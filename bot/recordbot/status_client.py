@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import math
+import os
+import time
+
+try:
+    from curl_cffi.requests import AsyncSession
+    CURL_CFFI_AVAILABLE = True
+except ImportError:
+    CURL_CFFI_AVAILABLE = False
+
+logger = logging.getLogger("RecordBot.StatusClient")
+
+BASE_URL = "https://chaturbate.com"
+IMPERSONATE_TARGETS = ["chrome131", "chrome124", "chrome120", "chrome116", "chrome110"]
+SESSIONS_PER_TARGET = int(os.environ.get("STATUS_SESSIONS_PER_TARGET", "4"))
+REQUEST_TIMEOUT = 25
+ENDPOINTS = ["edge", "context"]
+STATS_ALPHA = 0.2
+LATENCY_SCALE = 5.0
+EXPLORATION = float(os.environ.get("STATUS_EXPLORATION", "0.1"))
+BREAKER_THRESHOLD = int(os.environ.get("STATUS_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.environ.get("STATUS_BREAKER_COOLDOWN", "300"))
+PLAYLIST_MAX_AGE = float(os.environ.get("STATUS_PLAYLIST_MAX_AGE", "60"))
+
+COMMON_HEADERS = {
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Cache-Control": "no-cache",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+
+class SessionPool:
+    """Warm AsyncSessions for one impersonation target, reused across checks."""
+
+    def __init__(self, target, size=SESSIONS_PER_TARGET):
+        self.target = target
+        self.size = size
+        self._idle = []
+        self._created = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    return AsyncSession(impersonate=self.target)
+                await self._cond.wait()
+
+    async def release(self, session, discard=False):
+        async with self._cond:
+            if discard:
+                self._created -= 1
+            else:
+                self._idle.append(session)
+            self._cond.notify()
+        if discard:
+            try:
+                await session.close()
+            except Exception:
+                pass
+
+
+class Forbidden(Exception):
+    pass
+
+
+class ArmStats:
+    """Recent success rate and latency of one (endpoint, target) combination."""
+
+    def __init__(self):
+        self.success = 0.5
+        self.latency = LATENCY_SCALE
+        self.attempts = 0
+        self.forbidden_streak = 0
+        self.open_until = 0.0
+
+    def record(self, ok, latency, forbidden=False):
+        self.attempts += 1
+        self.success += STATS_ALPHA * ((1.0 if ok else 0.0) - self.success)
+        self.latency += STATS_ALPHA * (latency - self.latency)
+        if ok:
+            self.forbidden_streak = 0
+        elif forbidden:
+            self.forbidden_streak += 1
+            if self.forbidden_streak >= BREAKER_THRESHOLD:
+                self.open_until = time.monotonic() + BREAKER_COOLDOWN
+                return True
+        return False
+
+    def is_open(self, now):
+        return now < self.open_until
+
+
+class StatusClient:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.pools = {target: SessionPool(target) for target in IMPERSONATE_TARGETS}
+        self.arms = [(endpoint, target) for endpoint in ENDPOINTS for target in IMPERSONATE_TARGETS]
+        self.stats = {arm: ArmStats() for arm in self.arms}
+        self.playlists = {}
+
+    def _remember(self, username, data, playlist_url):
+        online = data.get("room_status", "") == "public"
+        if online and playlist_url and playlist_url.startswith("http"):
+            self.playlists[username] = (time.monotonic(), playlist_url)
+        else:
+            self.playlists.pop(username, None)
+        return online
+
+    def playlist_url(self, username, max_age=PLAYLIST_MAX_AGE):
+        entry = self.playlists.get(username)
+        if entry and time.monotonic() - entry[0] < max_age:
+            return entry[1]
+        return None
+
+    async def _request(self, session, method, url, **kwargs):
+        await self.limiter.acquire()
+        return await session.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+
+    async def _edge_status(self, target, username):
+        pool = self.pools[target]
+        session = await pool.acquire()
+        discard = False
+        try:
+            room_url = f"{BASE_URL}/{username}/"
+            for attempt in range(2):
+                if not session.cookies.get("csrftoken"):
+                    page = await self._request(session, "GET", room_url, headers=COMMON_HEADERS)
+                    if page.status_code == 403:
+                        raise Forbidden()
+
+                r = await self._request(
+                    session, "POST", f"{BASE_URL}/get_edge_hls_url_ajax/",
+                    headers={
+                        "X-Requested-With": "XMLHttpRequest",
+                        "X-CSRFToken": session.cookies.get("csrftoken", ""),
+                        "Referer": room_url,
+                        "Accept": "application/json, text/javascript, */*; q=0.01",
+                        "Origin": BASE_URL,
+                        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+                    },
+                    data={"room_slug": username, "bandwidth": "high"},
+                )
+                if r.status_code == 200:
+                    data = r.json()
+                    return self._remember(username, data, data.get("url"))
+                if r.status_code != 403:
+                    return None
+                # Stale CSRF token: drop cookies and fetch a fresh one once.
+                session.cookies.clear()
+            raise Forbidden()
+        except Forbidden:
+            raise
+        except Exception as e:
+            logger.debug(f"[{username}] {target} edge check failed: {e}")
+            discard = True
+            return None
+        finally:
+            await pool.release(session, discard=discard)
+
+    async def _context_status(self, target, username):
+        pool = self.pools[target]
+        session = await pool.acquire()
+        discard = False
+        try:
+            r = await self._request(
+                session, "GET", f"{BASE_URL}/api/chatvideocontext/{username}/",
+                headers=COMMON_HEADERS,
+            )
+            if r.status_code == 200:
+                data = r.json()
+                return self._remember(username, data, data.get("hls_source"))
+            if r.status_code == 403:
+                raise Forbidden()
+            return None
+        except Forbidden:
+            raise
+        except Exception as e:
+            logger.debug(f"[{username}] {target} context check failed: {e}")
+            discard = True
+            return None
+        finally:
+            await pool.release(session, discard=discard)
+
+    async def get_json(self, url, params=None):
+        """One rate-limited GET on a warm session; the decoded JSON body or None."""
+        if not CURL_CFFI_AVAILABLE:
+            logger.error("curl_cffi not available")
+            return None
+        pool = self.pools[IMPERSONATE_TARGETS[0]]
+        session = await pool.acquire()
+        discard = False
+        try:
+            r = await self._request(
+                session, "GET", url, params=params,
+                headers={**COMMON_HEADERS, "Accept": "application/json"},
+            )
+            if r.status_code == 200:
+                return r.json()
+            logger.warning(f"GET {url} returned {r.status_code}")
+            return None
+        except Exception as e:
+            logger.warning(f"GET {url} failed: {e}")
+            discard = True
+            return None
+        finally:
+            await pool.release(session, discard=discard)
+
+    def ranked_arms(self):
+        now = time.monotonic()
+        total = sum(st.attempts for st in self.stats.values()) + 1
+
+        def score(arm):
+            st = self.stats[arm]
+            bonus = math.sqrt(2 * math.log(total) / (st.attempts + 1))
+            return st.success / (1 + st.latency / LATENCY_SCALE) + EXPLORATION * bonus
+
+        closed = [arm for arm in self.arms if not self.stats[arm].is_open(now)]
+        return sorted(closed, key=score, reverse=True)
+
+    async def _attempt(self, arm, username):
+        endpoint, target = arm
+        started = time.monotonic()
+        forbidden = False
+        try:
+            if endpoint == "edge":
+                status = await self._edge_status(target, username)
+            else:
+                status = await self._context_status(target, username)
+        except Forbidden:
+            status = None
+            forbidden = True
+
+        tripped = self.stats[arm].record(status is not None, time.monotonic() - started, forbidden)
+        if tripped:
+            logger.warning(
+                f"{endpoint}/{target} returned 403 {BREAKER_THRESHOLD} times in a row — "
+                f"skipping it for {BREAKER_COOLDOWN:.0f}s"
+            )
+        return status
+
+    async def is_online(self, username):
+        if not CURL_CFFI_AVAILABLE:
+            logger.error("curl_cffi not available")
+            return None
+
+        arms = self.ranked_arms()
+        if not arms:
+            logger.warning(f"[{username}] All status endpoints are cooling down")
+            return None
+
+        for arm in arms:
+            status = await self._attempt(arm, username)
+            if status is not None:
+                return status
+
+        return None
+
+    def stats_summary(self):
+        now = time.monotonic()
+        return {
+            f"{endpoint}/{target}": {
+                "success": round(st.success, 3),
+                "latency": round(st.latency, 2),
+                "attempts": st.attempts,
+                "open": st.is_open(now),
+            }
+            for (endpoint, target), st in self.stats.items()
+        }
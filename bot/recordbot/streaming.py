@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import random
+
+try:
+    from telethon.tl.functions.upload import SaveBigFilePartRequest
+    from telethon.tl.types import InputFileBig
+    TELETHON_AVAILABLE = True
+except ImportError:
+    TELETHON_AVAILABLE = False
+
+logger = logging.getLogger("RecordBot.Streaming")
+
+STREAM_PART_SIZE = 512 * 1024
+STREAM_POLL_SECS = 1.0
+# Telegram only accepts saveBigFilePart uploads for files above 10 MB.
+BIG_FILE_MIN_BYTES = 10 * 1024 * 1024
+
+
+class StreamingUpload:
+    """Uploads a segment with upload.saveBigFilePart while ffmpeg is still writing it.
+
+    Parts are sent with file_total_parts=-1 until the segment is closed. The
+    last full part is always held back so the final request can carry the
+    real part count, even when the file size is an exact multiple of the
+    part size.
+    """
+
+    def __init__(self, path, pool):
+        self.path = path
+        self.pool = pool
+        # The uploaded parts belong to this session; whoever sends the
+        # InputFileBig must use it and release it afterwards.
+        self.lease = None
+        self.file_id = random.randrange(-2 ** 63, 2 ** 63)
+        self.parts_sent = 0
+        self.offset = 0
+        self.closed = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    def close(self):
+        self.closed.set()
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        else:
+            self._release()
+
+    async def result(self):
+        try:
+            return await self.task
+        except asyncio.CancelledError:
+            return None
+
+    async def _send(self, client, f, total_parts):
+        f.seek(self.offset)
+        chunk = f.read(STREAM_PART_SIZE)
+        await client(SaveBigFilePartRequest(self.file_id, self.parts_sent, total_parts, chunk))
+        self.parts_sent += 1
+        self.offset += len(chunk)
+
+    def _release(self, error=None):
+        if self.lease is not None:
+            self.pool.release(self.lease, error)
+            self.lease = None
+
+    async def _run(self):
+        name = os.path.basename(self.path)
+        try:
+            self.lease = await self.pool.acquire()
+            client = self.lease.client
+            while not os.path.exists(self.path):
+                if self.closed.is_set():
+                    self._release()
+                    return None
+                await asyncio.sleep(STREAM_POLL_SECS)
+
+            with open(self.path, "rb") as f:
+                while True:
+                    closed = self.closed.is_set()
+                    size = os.path.getsize(self.path)
+                    while size - self.offset > STREAM_PART_SIZE:
+                        await self._send(client, f, -1)
+                    if closed:
+                        break
+                    try:
+                        await asyncio.wait_for(self.closed.wait(), STREAM_POLL_SECS)
+                    except asyncio.TimeoutError:
+                        pass
+
+                if size == 0 or size < BIG_FILE_MIN_BYTES:
+                    logger.info(f"{name} closed at {size} bytes — too small for a streamed upload")
+                    self._release()
+                    return None
+                if size > self.offset:
+                    await self._send(client, f, self.parts_sent + 1)
+
+            logger.info(f"Streamed {name}: {self.parts_sent} parts, {self.offset // 1024 // 1024} MB")
+            return InputFileBig(self.file_id, self.parts_sent, name)
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception as e:
+            logger.warning(f"Streaming upload of {name} failed after {self.parts_sent} parts: {e}")
+            self._release(e)
+            return None
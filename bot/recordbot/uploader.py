@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger("RecordBot.Uploader")
+
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "3"))
+# Extra workers while disk pressure is high, so the on-disk backlog drains faster.
+UPLOAD_PRESSURE_WORKERS = int(os.environ.get("UPLOAD_PRESSURE_WORKERS", "2"))
+UPLOAD_BANDWIDTH_BPS = int(os.environ.get("UPLOAD_BANDWIDTH_BPS", "0"))
+UPLOAD_METRICS_SECS = 60
+# Bot API multipart uploads are capped at 50 MB; larger files must go over MTProto.
+BOT_API_MAX_BYTES = 50 * 1024 * 1024
+TRANSPORT_SIZE_BUCKETS = (5 * 1024 * 1024, 20 * 1024 * 1024, BOT_API_MAX_BYTES)
+
+
+class BandwidthLimiter:
+    """Byte budget shared by all upload workers; 0 means unlimited."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.unlimited = False
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    async def consume(self, nbytes):
+        if self.rate <= 0 or self.unlimited or nbytes <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= nbytes
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class TransportRouter:
+    """Orders the upload transports for a file by size and past success.
+
+    Success is an EWMA per (transport, size bucket). Both transports start
+    at 1.0 and the Bot API wins ties, which was the behaviour before routing.
+    """
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.success = {}
+
+    def _bucket(self, size):
+        for i, limit in enumerate(TRANSPORT_SIZE_BUCKETS):
+            if size <= limit:
+                return i
+        return len(TRANSPORT_SIZE_BUCKETS)
+
+    def choose(self, size, bot_api, mtproto):
+        if size > BOT_API_MAX_BYTES:
+            bot_api = False
+        candidates = [t for t, ok in (("bot_api", bot_api), ("mtproto", mtproto)) if ok]
+        bucket = self._bucket(size)
+        return sorted(candidates, key=lambda t: -self.success.get((t, bucket), 1.0))
+
+    def record(self, transport, size, ok):
+        key = (transport, self._bucket(size))
+        prev = self.success.get(key, 1.0)
+        self.success[key] = prev + self.alpha * ((1.0 if ok else 0.0) - prev)
+
+
+class UploadJob:
+    def __init__(self, user_id, filepath, run, final):
+        self.user_id = user_id
+        self.filepath = filepath
+        self.run = run
+        self.final = final
+        self.size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_event_loop().create_future()
+
+
+class UploadScheduler:
+    """Global upload queue: a fixed worker pool, round-robin across users.
+
+    Final segments of stopped recordings jump the queue so a user's last
+    part does not wait behind other users' running recordings.
+    """
+
+    def __init__(self, workers=UPLOAD_WORKERS, bandwidth=UPLOAD_BANDWIDTH_BPS):
+        self.worker_count = workers
+        self.limiter = BandwidthLimiter(bandwidth)
+        self.priority = deque()
+        self.queues = {}
+        self.turns = deque()
+        self.available = asyncio.Semaphore(0)
+        self.workers = {}
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.last_metrics_log = 0.0
+
+    def _ensure_workers(self):
+        for index in range(self.worker_count):
+            task = self.workers.get(index)
+            if task is None or task.done():
+                self.workers[index] = asyncio.create_task(self._worker(index))
+
+    def resize(self, workers):
+        """Grows the pool at once; surplus workers exit when they next pick up a job."""
+        if workers == self.worker_count:
+            return
+        logger.info(f"Upload workers: {self.worker_count} → {workers}")
+        self.worker_count = workers
+        if self.workers:
+            self._ensure_workers()
+
+    def depth(self):
+        return len(self.priority) + sum(len(q) for q in self.queues.values())
+
+    def submit(self, user_id, filepath, run, final=False):
+        self._ensure_workers()
+        job = UploadJob(user_id, filepath, run, final)
+        if final:
+            self.priority.append(job)
+        else:
+            if user_id not in self.queues:
+                self.queues[user_id] = deque()
+                self.turns.append(user_id)
+            self.queues[user_id].append(job)
+        self.max_depth = max(self.max_depth, self.depth())
+        self.available.release()
+        return job.future
+
+    def _pop(self):
+        if self.priority:
+            return self.priority.popleft()
+        while self.turns:
+            user_id = self.turns.popleft()
+            queue = self.queues.get(user_id)
+            if not queue:
+                self.queues.pop(user_id, None)
+                continue
+            job = queue.popleft()
+            if queue:
+                self.turns.append(user_id)
+            else:
+                del self.queues[user_id]
+            return job
+        return None
+
+    async def _worker(self, index):
+        while True:
+            await self.available.acquire()
+            if index >= self.worker_count:
+                # Shrunk away: leave the job for a worker that is staying.
+                self.available.release()
+                return
+            job = self._pop()
+            if job is None or job.future.cancelled():
+                continue
+            self.in_flight += 1
+            try:
+                result = await job.run()
+                self.completed += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"Upload job for {job.filepath} crashed: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.in_flight -= 1
+                self._log_metrics()
+
+    def progress_callback(self, filepath, start=0):
+        """Telethon-style progress hook charging newly sent bytes to the limiter.
+
+        `start` is the offset a resumed upload begins reporting from.
+        """
+        sent_before = [start]
+        last_logged = [0]
+        name = os.path.basename(filepath)
+
+        async def progress(sent, total):
+            delta = sent - sent_before[0]
+            sent_before[0] = sent
+            pct = sent / total * 100 if total else 100
+            if pct - last_logged[0] >= 10 or pct >= 100:
+                last_logged[0] = pct
+                logger.info(f"  ↑ {name}: {pct:.0f}%")
+            await self.limiter.consume(delta)
+
+        return progress
+
+    def metrics(self):
+        queued = list(self.priority) + [job for q in self.queues.values() for job in q]
+        now = time.monotonic()
+        return {
+            "queued": len(queued),
+            "queued_bytes": sum(job.size for job in queued),
+            "priority": len(self.priority),
+            "users_waiting": len(self.queues),
+            "in_flight": self.in_flight,
+            "workers": self.worker_count,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_depth": self.max_depth,
+            "oldest_wait": max((now - job.enqueued_at for job in queued), default=0),
+        }
+
+    def _log_metrics(self):
+        now = time.monotonic()
+        if now - self.last_metrics_log < UPLOAD_METRICS_SECS:
+            return
+        self.last_metrics_log = now
+        m = self.metrics()
+        logger.info(
+            f"Upload queue: {m['queued']} queued ({m['queued_bytes'] / 1024 ** 2:.0f} MB, "
+            f"{m['priority']} priority), {m['in_flight']}/{m['workers']} in flight, "
+            f"oldest {m['oldest_wait']:.0f}s, max depth {m['max_depth']}"
+        )
+
+
+upload_scheduler = UploadScheduler()
+transport_router = TransportRouter()
@@ -15,7 +15,8 @@ from bot.handlers.login import login_conv, setup_credentials_conv
 from bot.handlers.video_list import video_list_handler
 from bot.handlers.help import help_conv
 from bot.handlers.admin import (subscribers_cmd, stats_cmd, members_cmd,
-                                  kick_cmd, audit_cmd, track_channel_member)
+                                  kick_cmd, audit_cmd, recorder_cmd,
+                                  track_channel_member)
 from bot.recordbot.handlers import recordbot_conv
 from bot.recordbot import recorder as rb_recorder
 
@@ -48,6 +49,10 @@ async def capture_file_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def post_init(application):
     rb_recorder._ptb_bot = application.bot
+    try:
+        await rb_recorder.recover_state()
+    except Exception as e:
+        logger.exception(f"RecordBot recovery failed: {e}")
     asyncio.create_task(rb_recorder.recorder_loop())
     logger.info("RecordBot recorder loop started")
 
@@ -85,6 +90,7 @@ def main():
     app.add_handler(CommandHandler("members", members_cmd))
     app.add_handler(CommandHandler("kick", kick_cmd))
     app.add_handler(CommandHandler("audit", audit_cmd))
+    app.add_handler(CommandHandler("recorder", recorder_cmd))
 
     # Callback handlers
     app.add_handler(CallbackQueryHandler(back_to_menu, pattern="^back_to_menu$"))